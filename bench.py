@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from framework.database import Settings
+from framework.engine import Engine, create_verdict_cache, create_known_bad
+from framework.fake import FakeClient, FakeEvent
+from framework.metrics import metrics
+
+BAD_COUNTRIES = ['IN', 'PK', 'BD', 'NG']
+
+def scenario_burst(count: int, rng: random.Random) -> list:
+    return [(0.0, 1000)] * count
+
+def scenario_unique(count: int, rng: random.Random) -> list:
+    return [(0.0, 1000 + i) for i in range(count)]
+
+def scenario_repeat(count: int, rng: random.Random, senders: int = 25) -> list:
+    return [(0.0, 1000 + rng.randrange(senders)) for _ in range(count)]
+
+def scenario_recorded(path: str) -> list:
+    events = []
+    with open(path, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                events.append((float(record.get('delay', 0.0)), int(record['sender_id'])))
+    return events
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def replay(name: str, events: list, args) -> dict:
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp(prefix = 'jeetblock-bench-')
+    db_path = os.path.join(directory, 'settings.db')
+
+    settings = Settings(db_path)
+    with settings.batch():
+        settings.add_countries(BAD_COUNTRIES)
+        settings.configure_block_user(True)
+        settings.configure_delete_chat(True)
+
+    conf = {
+        'action_concurrency': args.concurrency,
+        'action_default_rate': (args.rate, max(1, int(args.rate))),
+        'cache_size': args.cache_size,
+        'intake_workers': args.workers,
+        'degrade_depth': args.degrade_depth or len(events) + 1,
+        'reputation_file': os.path.join(directory, 'reputation.bin')
+    }
+
+    countries = {
+        sender_id: rng.choice(BAD_COUNTRIES) if rng.random() < args.bad_ratio else 'US'
+        for _, sender_id in events
+    }
+    client = FakeClient(
+        countries = countries,
+        latency = args.latency / 1000,
+        jitter = args.jitter / 1000,
+        error_rate = args.error_rate,
+        flood_rate = args.flood_rate,
+        flood_seconds = args.flood_seconds,
+        seed = args.seed
+    )
+
+    verdicts = create_verdict_cache(settings, conf)
+    engine = Engine(client, settings, verdicts, conf, known_bad = create_known_bad(settings))
+    await engine.start()
+
+    def counted(metric: str, **labels):
+        return sum(
+            value for (name, pairs), value in metrics.counters.items()
+            if name == metric and all(pair in pairs for pair in labels.items())
+        )
+
+    sql_before = counted('jeetblock_db_queries_total')
+    degraded_before = counted('jeetblock_degrade_transitions_total', state = 'degraded')
+    deferred_before = counted('jeetblock_deferred_total')
+
+    latencies = []
+    processed = set()
+    async def timed(event):
+        started = time.perf_counter()
+        done = await engine.handle_message(event)
+        if done is not None:
+            processed.add(done)
+            await asyncio.wait([done])
+        latencies.append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    for delay, sender_id in events:
+        if delay:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(timed(FakeEvent(sender_id))))
+
+    results = await asyncio.gather(*tasks, return_exceptions = True)
+    elapsed = time.perf_counter() - started
+    sql = counted('jeetblock_db_queries_total') - sql_before
+    degraded = counted('jeetblock_degrade_transitions_total', state = 'degraded') - degraded_before
+    deferred = counted('jeetblock_deferred_total') - deferred_before
+
+    await engine.stop()
+    engine.audit.flush()
+    settings.close()
+    shutil.rmtree(directory, ignore_errors = True)
+
+    return {
+        'scenario': name,
+        'events': len(events),
+        'errors': sum(1 for result in results if isinstance(result, Exception)) + sum(1 for done in processed if not done.cancelled() and done.exception() is not None),
+        'throughput': len(events) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rpc': dict(client.calls),
+        'rpc_total': sum(client.calls.values()),
+        'sql': sql,
+        'degraded': degraded,
+        'deferred': deferred,
+        'cache': verdicts.stats()
+    }
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['scenario']:<10} events={report['events']:<6} "
+        f"throughput={report['throughput']:>9.1f}/s p50={report['p50_ms']:>8.2f}ms p99={report['p99_ms']:>8.2f}ms "
+        f"rpc={report['rpc_total']:<6} sql={report['sql']:<6} errors={report['errors']}"
+    )
+    if report['degraded']:
+        print(f"{'':<10} degrade mode entered {report['degraded']}x, {report['deferred']} actions deferred past the run")
+    for method, calls in sorted(report['rpc'].items()):
+        print(f'{"":<10} {method}: {calls}')
+
+async def main(args) -> None:
+    rng = random.Random(args.seed)
+    scenarios = {
+        'burst': lambda: scenario_burst(args.events, rng),
+        'unique': lambda: scenario_unique(args.events, rng),
+        'repeat': lambda: scenario_repeat(args.events, rng)
+    }
+    if args.replay:
+        scenarios = {'recorded': lambda: scenario_recorded(args.replay)}
+    elif args.scenario != 'all':
+        scenarios = {args.scenario: scenarios[args.scenario]}
+
+    reports = []
+    for name, build in scenarios.items():
+        report = await replay(name, build(), args)
+        reports.append(report)
+        if not args.json:
+            print_report(report)
+
+    if args.json:
+        print(json.dumps(reports, indent = 4))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog = 'bench', description = 'replay synthetic or recorded message streams against a fake telegram client')
+    parser.add_argument('--scenario', choices = ['all', 'burst', 'unique', 'repeat'], default = 'all')
+    parser.add_argument('--replay', default = None, help = 'json lines file of {"sender_id": ..., "delay": seconds}')
+    parser.add_argument('--events', type = int, default = 500)
+    parser.add_argument('--bad-ratio', type = float, default = 0.3)
+    parser.add_argument('--latency', type = float, default = 50.0, help = 'mean rpc latency in ms')
+    parser.add_argument('--jitter', type = float, default = 10.0, help = 'rpc latency stddev in ms')
+    parser.add_argument('--error-rate', type = float, default = 0.0)
+    parser.add_argument('--flood-rate', type = float, default = 0.0)
+    parser.add_argument('--flood-seconds', type = int, default = 1)
+    parser.add_argument('--concurrency', type = int, default = 4)
+    parser.add_argument('--rate', type = float, default = 1000.0, help = 'token bucket rate per rpc method')
+    parser.add_argument('--workers', type = int, default = 32, help = 'messages processed at once')
+    parser.add_argument('--degrade-depth', type = int, default = None, help = 'queued messages that switch on degrade mode (default: never, one more than --events)')
+    parser.add_argument('--cache-size', type = int, default = 10000)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--json', action = 'store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,266 @@
+import time
+import asyncio
+
+from telethon import functions
+from telethon.errors import FloodWaitError
+from telethon.tl.types import PeerUser
+
+from framework.metrics import metrics
+from framework.store import get_store
+
+ACTIONS = {
+    'block': lambda sender_id: functions.contacts.BlockRequest(id = sender_id),
+    'delete': lambda sender_id: functions.messages.DeleteHistoryRequest(peer = PeerUser(sender_id), max_id = 0, revoke = True)
+}
+
+class Postponed(Exception):
+    def __init__(self, seconds: float) -> None:
+        super().__init__(f'Rate Limited for {seconds:.0f}s')
+        self.seconds = seconds
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    async def acquire(self, max_wait: float = None) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                if max_wait is not None and self.blocked_until - now > max_wait:
+                    raise Postponed(self.blocked_until - now)
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+class ActionExecutor:
+    def __init__(self, client, concurrency: int = 4, rates: dict = {}, default_rate: tuple = (3.0, 5)) -> None:
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rates = rates
+        self.default_rate = default_rate
+        self.buckets = {}
+        self.waiting = 0
+        self.running = 0
+
+    def bucket(self, method: str) -> TokenBucket:
+        if method not in self.buckets:
+            self.buckets[method] = TokenBucket(*self.rates.get(method, self.default_rate))
+        return self.buckets[method]
+
+    async def send(self, request, method: str):
+        metrics.inc('jeetblock_rpc_total', method = method)
+        started = time.perf_counter()
+        try:
+            return await self.client(request)
+        finally:
+            metrics.observe('jeetblock_rpc_seconds', time.perf_counter() - started, method = method)
+
+    async def call(self, request, limited: bool = False, max_wait: float = None):
+        method = type(request).__name__
+        bucket = self.bucket(method)
+
+        while True:
+            if limited:
+                self.waiting += 1
+                try:
+                    await bucket.acquire(max_wait)
+                    await self.semaphore.acquire()
+                finally:
+                    self.waiting -= 1
+                self.running += 1
+            else:
+                await bucket.acquire()
+
+            try:
+                return await self.send(request, method)
+            except FloodWaitError as E:
+                metrics.inc('jeetblock_flood_waits_total', method = method)
+                bucket.penalize(E.seconds)
+                if max_wait is not None and E.seconds > max_wait:
+                    raise Postponed(E.seconds) from E
+            finally:
+                if limited:
+                    self.running -= 1
+                    self.semaphore.release()
+
+    async def timed(self, action: str, sender_id: int, timings: dict = None, max_wait: float = None):
+        started = time.perf_counter()
+        try:
+            await self.call(ACTIONS[action](sender_id), limited = True, max_wait = max_wait)
+            return None
+        except Exception as E:
+            return E
+        finally:
+            if timings is not None:
+                timings[action] = time.perf_counter() - started
+
+    async def run(self, sender_id: int, actions: list, timings: dict = None, max_wait: float = None) -> dict:
+        results = await asyncio.gather(*(self.timed(action, sender_id, timings, max_wait) for action in actions))
+        return dict(zip(actions, results))
+
+class ActionQueue:
+    def __init__(self, db_path: str = 'settings.db', account: str = '', lease: float = 300.0, max_attempts: int = 5) -> None:
+        self.db_path = db_path
+        self.account = account
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.staged = []
+        self.commit_future = None
+        self.running = set()
+
+        self.store = get_store(db_path)
+        self.store.call(self.__init_db__)
+
+    def __init_db__(self, conn) -> None:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(pending_actions)')]
+        if columns and 'account' not in columns:
+            conn.execute('DROP INDEX IF EXISTS pending_actions_due')
+            conn.execute('ALTER TABLE pending_actions RENAME TO pending_actions_legacy')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_actions (
+                account TEXT NOT NULL DEFAULT '',
+                sender_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                next_attempt REAL NOT NULL,
+                last_error TEXT,
+                leased INTEGER DEFAULT 0,
+                PRIMARY KEY (account, sender_id, action)
+            )
+        ''')
+        if 'leased' not in [row[1] for row in conn.execute('PRAGMA table_info(pending_actions)')]:
+            conn.execute('ALTER TABLE pending_actions ADD COLUMN leased INTEGER DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS pending_actions_due ON pending_actions (account, next_attempt)')
+
+        if columns and 'account' not in columns:
+            conn.execute('''
+                INSERT OR IGNORE INTO pending_actions (sender_id, action, attempts, created_at, next_attempt, last_error)
+                SELECT sender_id, action, attempts, created_at, next_attempt, last_error FROM pending_actions_legacy
+            ''')
+            conn.execute('DROP TABLE pending_actions_legacy')
+
+    def __flush__(self) -> None:
+        staged, self.staged = self.staged, []
+        future, self.commit_future = self.commit_future, None
+
+        def write(conn):
+            for statement, rows in staged:
+                conn.executemany(statement, rows)
+
+        def resolve(written):
+            if future.done():
+                return
+            if written.exception() is not None:
+                future.set_exception(written.exception())
+            else:
+                future.set_result(None)
+
+        asyncio.wrap_future(self.store.submit(write)).add_done_callback(resolve)
+
+    async def commit(self) -> None:
+        if self.commit_future is None:
+            loop = asyncio.get_running_loop()
+            self.commit_future = loop.create_future()
+            loop.call_soon(self.__flush__)
+
+        await asyncio.shield(self.commit_future)
+
+    async def enqueue(self, sender_id: int, actions: list, leased: bool = True, delay: float = 0.0) -> None:
+        now = time.time()
+        if leased:
+            self.running.update((sender_id, action) for action in actions)
+        self.staged.append((
+            'INSERT OR IGNORE INTO pending_actions (account, sender_id, action, created_at, next_attempt, leased) VALUES (?, ?, ?, ?, ?, ?)',
+            [(self.account, sender_id, action, now, now + self.lease if leased else now + delay, int(leased)) for action in actions]
+        ))
+        await self.commit()
+
+    async def complete(self, sender_id: int, results: dict) -> None:
+        now = time.time()
+        self.running.difference_update((sender_id, action) for action in results)
+        done = [(self.account, sender_id, action) for action, error in results.items() if error is None]
+        postponed = [(now + error.seconds, self.account, sender_id, action) for action, error in results.items() if isinstance(error, Postponed)]
+        failed = [(str(error), now, self.account, sender_id, action) for action, error in results.items() if error is not None and not isinstance(error, Postponed)]
+
+        if done:
+            self.staged.append(('DELETE FROM pending_actions WHERE account = ? AND sender_id = ? AND action = ?', done))
+        if postponed:
+            self.staged.append(('UPDATE pending_actions SET next_attempt = ?, leased = 0 WHERE account = ? AND sender_id = ? AND action = ?', postponed))
+        if failed:
+            self.staged.append((
+                'UPDATE pending_actions SET attempts = attempts + 1, last_error = ?, next_attempt = ? + 30 * (1 << MIN(attempts, 10)), leased = 0 WHERE account = ? AND sender_id = ? AND action = ?',
+                failed
+            ))
+            self.staged.append(('DELETE FROM pending_actions WHERE account = ? AND attempts >= ?', [(self.account, self.max_attempts)]))
+
+        await self.commit()
+
+    async def release(self) -> None:
+        await asyncio.wrap_future(self.store.execute(
+            'UPDATE pending_actions SET next_attempt = MIN(next_attempt, ?), leased = 0 WHERE account = ? AND leased = 1',
+            (time.time(), self.account)
+        ))
+
+    async def take_due(self, limit: int = 500) -> dict:
+        now = time.time()
+        running = frozenset(self.running)
+
+        def lease(conn):
+            rows = [
+                row for row in conn.execute(
+                    'SELECT sender_id, action FROM pending_actions WHERE account = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?',
+                    (self.account, now, limit + len(running))
+                ).fetchall()
+                if row not in running
+            ][:limit]
+            conn.executemany(
+                'UPDATE pending_actions SET next_attempt = ?, leased = 1 WHERE account = ? AND sender_id = ? AND action = ?',
+                [(now + self.lease, self.account, sender_id, action) for sender_id, action in rows]
+            )
+            return rows
+
+        rows = await self.store.run(lease)
+        self.running.update(rows)
+
+        due = {}
+        for sender_id, action in rows:
+            due.setdefault(sender_id, []).append(action)
+        return due
+
+    async def depth(self) -> int:
+        return (await self.store.fetchone('SELECT COUNT(*) FROM pending_actions WHERE account = ?', (self.account,)))[0]
+
+    async def drain(self, executor: ActionExecutor, report) -> int:
+        drained = 0
+        while True:
+            due = await self.take_due()
+            if not due:
+                return drained
+
+            async def process(sender_id, actions):
+                timings = {}
+                results = await executor.run(sender_id, actions, timings)
+                await self.complete(sender_id, results)
+                report(sender_id, results, timings)
+
+            await asyncio.gather(*(process(sender_id, actions) for sender_id, actions in due.items()))
+            drained += len(due)
+
+metrics.describe('jeetblock_postponed_total', 'Actions handed to the pending queue because the rate limit would hold them longer than flood_defer.')
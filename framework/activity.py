@@ -0,0 +1,165 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from framework.bus import TAGS, BREAKS, render_text
+
+class ActivityLog:
+    def __init__(self, directory: str = 'logs', max_bytes: int = 4 * 1024 * 1024, keep: int = 50, flush_interval: float = 2.0) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.scheduled = None
+        self.lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'activity')
+
+        os.makedirs(directory, exist_ok = True)
+        self.segments = self.__scan__()
+        self.current = self.segments[-1][0] if self.segments and os.path.getsize(self.segments[-1][0]) < max_bytes else None
+
+    def __scan__(self) -> list:
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('activity-') and name.endswith('.jsonl.gz')):
+                continue
+
+            path = os.path.join(self.directory, name)
+            first = last = None
+            for entry in self.read_index(path):
+                first = entry['first'] if first is None else first
+                last = entry['last']
+            if first is not None:
+                segments.append([path, first, last])
+        return segments
+
+    def read_index(self, path: str):
+        index = path[:-len('.jsonl.gz')] + '.idx'
+        if not os.path.exists(index):
+            return
+        with open(index, 'r', encoding = 'utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    def sink(self, record) -> None:
+        self.write(render_text(record), record.kind, record.account, record.ts)
+
+    def write(self, text: str, kind: str = 'ui', account: str = '', ts: float = None) -> None:
+        self.buffer.append({
+            'ts': round(time.time() if ts is None else ts, 3),
+            'kind': kind,
+            'account': account,
+            'text': ' '.join(TAGS.sub('', BREAKS.sub(' ', text)).split())
+        })
+
+        if self.scheduled is None:
+            try:
+                self.scheduled = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def flush(self):
+        if self.scheduled is not None:
+            self.scheduled.cancel()
+            self.scheduled = None
+
+        if not self.buffer:
+            return None
+
+        lines, self.buffer = self.buffer, []
+        return self.writer.submit(self.__append__, lines)
+
+    def __append__(self, lines: list) -> None:
+        with self.lock:
+            if self.current is None or os.path.getsize(self.current) >= self.max_bytes:
+                self.__rotate__(lines[0]['ts'])
+
+            member = gzip.compress(''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8'))
+            with open(self.current, 'ab') as file:
+                offset = file.tell()
+                file.write(member)
+
+            entry = {'offset': offset, 'size': len(member), 'first': lines[0]['ts'], 'last': lines[-1]['ts'], 'lines': len(lines)}
+            with open(self.current[:-len('.jsonl.gz')] + '.idx', 'a', encoding = 'utf-8') as file:
+                file.write(json.dumps(entry) + '\n')
+
+            if self.segments and self.segments[-1][0] == self.current:
+                self.segments[-1][2] = entry['last']
+            else:
+                self.segments.append([self.current, entry['first'], entry['last']])
+
+    def __rotate__(self, ts: float) -> None:
+        name = datetime.fromtimestamp(ts).strftime('activity-%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f'{name}.jsonl.gz')
+        suffix = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f'{name}-{suffix}.jsonl.gz')
+            suffix += 1
+        self.current = path
+
+        while len(self.segments) >= self.keep:
+            expired = self.segments.pop(0)[0]
+            for stale in (expired, expired[:-len('.jsonl.gz')] + '.idx'):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+    def search(self, text: str = '', since: float = None, until: float = None, limit: int = 1000):
+        needle = text.lower()
+        found = 0
+
+        with self.lock:
+            segments = [list(segment) for segment in self.segments]
+
+        for path, first, last in reversed(segments):
+            if (since is not None and last < since) or (until is not None and first > until):
+                continue
+
+            try:
+                members = [
+                    entry for entry in self.read_index(path)
+                    if (since is None or entry['last'] >= since) and (until is None or entry['first'] <= until)
+                ]
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+
+            with file:
+                for entry in reversed(members):
+                    file.seek(entry['offset'])
+                    matches = []
+                    for line in gzip.decompress(file.read(entry['size'])).decode('utf-8').splitlines():
+                        line = json.loads(line)
+                        if since is not None and line['ts'] < since:
+                            continue
+                        if until is not None and line['ts'] > until:
+                            continue
+                        if needle and needle not in line['text'].lower():
+                            continue
+                        matches.append(line)
+
+                    matches.reverse()
+                    matches = matches[:limit - found]
+                    found += len(matches)
+                    if matches:
+                        yield matches
+                    if found >= limit:
+                        return
+
+    async def stream(self, text: str = '', since: float = None, until: float = None, limit: int = 1000):
+        results = self.search(text, since, until, limit)
+        while True:
+            batch = await asyncio.to_thread(next, results, None)
+            if batch is None:
+                return
+            yield batch
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.shutdown(wait = True)
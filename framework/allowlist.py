@@ -0,0 +1,96 @@
+import asyncio
+from array import array
+from bisect import bisect_left
+
+from telethon import events, functions
+
+class IdSet:
+    def __init__(self, ids = ()) -> None:
+        self.replace(ids)
+
+    def replace(self, ids) -> None:
+        self.base = array('q', sorted(set(ids)))
+        self.added = set()
+        self.removed = set()
+
+    def in_base(self, user_id: int) -> bool:
+        index = bisect_left(self.base, user_id)
+        return index < len(self.base) and self.base[index] == user_id
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id in self.added:
+            return True
+        if user_id in self.removed:
+            return False
+        return self.in_base(user_id)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.added) - len(self.removed)
+
+    def add(self, user_id: int) -> None:
+        self.removed.discard(user_id)
+        if not self.in_base(user_id):
+            self.added.add(user_id)
+            if len(self.added) > 4096:
+                self.compact()
+
+    def discard(self, user_id: int) -> None:
+        self.added.discard(user_id)
+        if self.in_base(user_id):
+            self.removed.add(user_id)
+
+    def compact(self) -> None:
+        self.replace((set(self.base) | self.added) - self.removed)
+
+class Allowlist:
+    def __init__(self, client, executor, refresh: float = 600.0) -> None:
+        self.client = client
+        self.executor = executor
+        self.refresh = refresh
+        self.contacts = IdSet()
+        self.conversations = IdSet()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.contacts or user_id in self.conversations
+
+    def __len__(self) -> int:
+        return len(self.contacts) + len(self.conversations)
+
+    async def fetch_contacts(self) -> list:
+        result = await self.executor.call(functions.contacts.GetContactsRequest(hash = 0))
+        return [contact.user_id for contact in getattr(result, 'contacts', [])]
+
+    async def load(self) -> int:
+        self.contacts.replace(await self.fetch_contacts())
+
+        conversations = []
+        async for dialog in self.client.iter_dialogs(ignore_migrated = True):
+            if not dialog.is_user:
+                continue
+
+            message = getattr(dialog, 'message', None)
+            raw = getattr(dialog, 'dialog', None)
+            if getattr(message, 'out', False) or getattr(raw, 'read_outbox_max_id', 0):
+                conversations.append(dialog.entity.id)
+
+        self.conversations.replace(conversations)
+        return len(self)
+
+    async def refresh_contacts(self, on_error = None) -> None:
+        while True:
+            await asyncio.sleep(self.refresh)
+            try:
+                self.contacts.replace(await self.fetch_contacts())
+            except Exception as E:
+                if on_error is not None:
+                    on_error(E)
+
+    async def on_outgoing(self, event) -> None:
+        if event.is_private and event.chat_id:
+            self.conversations.add(event.chat_id)
+
+    def attach(self) -> None:
+        self.client.add_event_handler(self.on_outgoing, events.NewMessage(outgoing = True))
+
+    def detach(self) -> None:
+        self.client.remove_event_handler(self.on_outgoing, events.NewMessage(outgoing = True))
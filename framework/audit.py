@@ -0,0 +1,85 @@
+import time
+import asyncio
+
+from framework.store import get_store
+
+COLUMNS = ('ts', 'account', 'sender_id', 'country', 'action', 'rule', 'latency', 'error', 'username')
+
+class AuditLog:
+    def __init__(self, db_path: str = 'settings.db', flush_interval: float = 0.5, batch_size: int = 500) -> None:
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer = []
+        self.scheduled = None
+
+        self.store = get_store(db_path)
+        self.store.call(self.__init_db__)
+
+    def __init_db__(self, conn) -> None:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                account TEXT DEFAULT '',
+                sender_id INTEGER NOT NULL,
+                country TEXT,
+                action TEXT NOT NULL,
+                rule TEXT,
+                latency REAL,
+                error TEXT,
+                username TEXT
+            )
+        ''')
+        if 'username' not in [row[1] for row in conn.execute('PRAGMA table_info(audit_log)')]:
+            conn.execute('ALTER TABLE audit_log ADD COLUMN username TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS audit_log_ts ON audit_log (ts)')
+        conn.execute('CREATE INDEX IF NOT EXISTS audit_log_sender ON audit_log (sender_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS audit_log_country ON audit_log (country, ts)')
+        conn.execute('CREATE INDEX IF NOT EXISTS audit_log_action ON audit_log (action, ts)')
+
+    def record(self, sender_id: int, action: str, country: str = None, rule: str = None, latency: float = None, error: str = None, account: str = '', username: str = None) -> None:
+        self.buffer.append((time.time(), account, sender_id, country, action, rule, latency, error, username))
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        elif self.scheduled is None:
+            try:
+                self.scheduled = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def flush(self) -> None:
+        if self.scheduled is not None:
+            self.scheduled.cancel()
+            self.scheduled = None
+
+        if not self.buffer:
+            return
+
+        rows, self.buffer = self.buffer, []
+        self.store.executemany(
+            f'INSERT INTO audit_log ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+            rows
+        )
+
+    def close(self) -> None:
+        self.flush()
+        self.store.flush()
+
+def audit_filter(country: str = None, action: str = None, since: float = None, until: float = None) -> tuple:
+    clauses, params = [], []
+    if country:
+        clauses.append('country = ?')
+        params.append(country)
+    if action:
+        clauses.append('action = ?')
+        params.append(action)
+    if since is not None:
+        clauses.append('ts >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('ts < ?')
+        params.append(until)
+
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', tuple(params)
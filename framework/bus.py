@@ -0,0 +1,116 @@
+import re
+import time
+from typing import NamedTuple
+
+from framework.metrics import metrics
+
+BREAKS = re.compile(r'<br\s*/?>')
+TAGS = re.compile(r'<[^>]+>')
+
+FLAGS = {
+    'block': 'log_block',
+    'delete': 'log_delete',
+    'error': 'log_errors',
+    'user_info': 'log_user_info'
+}
+
+LINES = frozenset(('detection', 'block', 'delete', 'user_info'))
+
+TEMPLATES = {
+    'detection': ('OUTPUT', 'lightblue', '<b>Threat Detected</b> (UID: {sender_id}, Country: {country}, Rule: {rule})'),
+    'block': ('OUTPUT', 'lightblue', 'Blocked User'),
+    'delete': ('OUTPUT', 'lightblue', 'Deleted Chat'),
+    'error': ('FAILURE', 'red', '{message}'),
+    'fault': ('FAILURE', 'red', '{message}'),
+    'user_info': (None, None, '<br>Username: {username}<br>Nickname: {name}<br>Has Premium: {premium}<br>Has Profile Picture: {photo}<br>'),
+    'queue': ('QUEUE', 'lightblue', 'Processed Pending Actions for {drained} Users'),
+    'sweep_start': ('SWEEP', 'lightblue', '{mode} Inbox Sweep'),
+    'sweep_progress': ('SWEEP', 'lightblue', 'Checked {processed} Dialogs ({matched} Threats)'),
+    'sweep_done': ('SWEEP', 'lightblue', 'Finished Inbox Sweep: {processed} Dialogs, {matched} Threats'),
+    'allowlist': ('ALLOW', 'lightblue', 'Allowlisted {size} Contacts and Conversations'),
+    'startup': ('CACHE', 'lightblue', 'Loaded {size} Cached Verdicts, {reputation} Known Threats'),
+    'degraded': ('LOAD', 'orange', 'Under Load ({depth} Queued, {lag:.0f} ms Lag): Hiding Per-Message Lines, Skipping User Info, Deferring Chat Deletion'),
+    'recovered': ('LOAD', 'lightblue', 'Load Back to Normal: {skipped} Lines Hidden, {deferred} Chat Deletions Deferred')
+}
+
+class Record(NamedTuple):
+    kind: str
+    ts: float
+    account: str
+    fields: dict
+
+def render_html(record: Record) -> str:
+    tag, color, template = TEMPLATES.get(record.kind, (record.kind.upper(), 'lightblue', ''))
+    text = template.format(**record.fields)
+    if tag is None:
+        return text
+    return f"""[<span style="color: {color};">{tag}</span>] {text}"""
+
+def render_text(record: Record) -> str:
+    return ' '.join(TAGS.sub('', BREAKS.sub(' ', render_html(record))).split())
+
+def count_record(record: Record) -> None:
+    metrics.inc('jeetblock_events_total', kind = record.kind)
+
+class EventBus:
+    def __init__(self, settings = None) -> None:
+        self.settings = settings
+        self.sinks = []
+        self.shedding = set()
+        self.skipped = 0
+
+    def add_sink(self, sink, filtered: bool = True, sheddable: bool = False) -> None:
+        self.sinks.append((sink, filtered, sheddable))
+
+    def remove_sink(self, sink) -> None:
+        self.sinks = [entry for entry in self.sinks if entry[0] is not sink]
+
+    def shed(self, account: str, enabled: bool) -> int:
+        if enabled:
+            self.shedding.add(account)
+            return 0
+
+        self.shedding.discard(account)
+        skipped = self.skipped
+        if not self.shedding:
+            self.skipped = 0
+        return skipped
+
+    def enabled(self, kind: str) -> bool:
+        flag = FLAGS.get(kind)
+        return flag is None or self.settings is None or getattr(self.settings.snapshot, flag)
+
+    def emit(self, kind: str, account: str = '', **fields) -> None:
+        if not self.sinks:
+            return
+
+        allowed = self.enabled(kind)
+        shedding = bool(self.shedding) and kind in LINES
+        record = None
+        for sink, filtered, sheddable in self.sinks:
+            if filtered and not allowed:
+                continue
+            if sheddable and shedding:
+                self.skipped += 1
+                continue
+            if record is None:
+                record = Record(kind, time.time(), account, fields)
+            sink(record)
+
+    def bind(self, account: str = '') -> 'Emitter':
+        return Emitter(self, account)
+
+class Emitter:
+    __slots__ = ('bus', 'account')
+
+    def __init__(self, bus: EventBus, account: str = '') -> None:
+        self.bus = bus
+        self.account = account
+
+    def enabled(self, kind: str) -> bool:
+        return self.bus.enabled(kind)
+
+    def emit(self, kind: str, **fields) -> None:
+        self.bus.emit(kind, self.account, **fields)
+
+metrics.describe('jeetblock_events_total', 'Engine events emitted, by kind (including ones hidden by the log_* settings).')
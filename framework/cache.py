@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+
+from framework.metrics import metrics
+from framework.store import get_store
+
+class Verdict:
+    __slots__ = ('phone_country', 'checked_at')
+
+    def __init__(self, phone_country: str, checked_at: float = 0.0) -> None:
+        self.phone_country = phone_country
+        self.checked_at = checked_at
+
+class VerdictCache:
+    def __init__(self, db_path: str = 'settings.db', max_size: int = 10000, ttl: float = 86400.0):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.store = get_store(db_path)
+        metrics.gauge('jeetblock_cache_hits', lambda: self.hits)
+        metrics.gauge('jeetblock_cache_misses', lambda: self.misses)
+        metrics.gauge('jeetblock_cache_size', lambda: len(self.entries))
+
+        rows = self.store.call(self.__init_db__)
+        for sender_id, phone_country, checked_at in reversed(rows):
+            self.entries[sender_id] = Verdict(phone_country, checked_at)
+
+    def __init_db__(self, conn) -> list:
+        curs = conn.cursor()
+
+        curs.execute('''
+            CREATE TABLE IF NOT EXISTS verdicts (
+                sender_id INTEGER PRIMARY KEY,
+                phone_country TEXT,
+                checked_at REAL NOT NULL
+            )
+        ''')
+        curs.execute('DELETE FROM verdicts WHERE checked_at < ?', (time.time() - self.ttl,))
+        curs.execute('SELECT sender_id, phone_country, checked_at FROM verdicts ORDER BY checked_at DESC LIMIT ?', (self.max_size,))
+        return curs.fetchall()
+
+    def get(self, sender_id: int) -> Verdict:
+        verdict = self.entries.get(sender_id)
+        if verdict is None or time.time() - verdict.checked_at > self.ttl:
+            if verdict is not None:
+                del self.entries[sender_id]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(sender_id)
+        self.hits += 1
+        return verdict
+
+    def put(self, sender_id: int, phone_country: str) -> Verdict:
+        verdict = Verdict(phone_country, time.time())
+        self.entries[sender_id] = verdict
+        self.entries.move_to_end(sender_id)
+
+        evicted = []
+        while len(self.entries) > self.max_size:
+            evicted.append(self.entries.popitem(last = False)[0])
+
+        self.store.execute(
+            'INSERT OR REPLACE INTO verdicts (sender_id, phone_country, checked_at) VALUES (?, ?, ?)',
+            (sender_id, phone_country, verdict.checked_at)
+        )
+        if evicted:
+            self.store.executemany('DELETE FROM verdicts WHERE sender_id = ?', [(uid,) for uid in evicted])
+
+        return verdict
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
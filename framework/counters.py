@@ -0,0 +1,86 @@
+import time
+import asyncio
+
+from framework.store import get_store
+
+class CounterStore:
+    def __init__(self, db_path: str = 'settings.db', flush_interval: float = 30.0) -> None:
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.scheduled = None
+
+        self.store = get_store(db_path)
+        self.store.call(self.__init_db__)
+
+    def __init_db__(self, conn) -> None:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                hour INTEGER NOT NULL,
+                account TEXT NOT NULL DEFAULT '',
+                country TEXT NOT NULL DEFAULT '',
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (hour, account, country, name)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS counters_name ON counters (name, hour)')
+
+    def increment(self, name: str, country: str = None, account: str = '', amount: int = 1) -> None:
+        key = (int(time.time() // 3600), account, country or '', name)
+        self.pending[key] = self.pending.get(key, 0) + amount
+
+        if self.scheduled is None:
+            try:
+                self.scheduled = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def flush(self):
+        if self.scheduled is not None:
+            self.scheduled.cancel()
+            self.scheduled = None
+
+        if not self.pending:
+            return None
+
+        pending, self.pending = self.pending, {}
+        return self.store.executemany(
+            '''
+                INSERT INTO counters (hour, account, country, name, value) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (hour, account, country, name) DO UPDATE SET value = value + excluded.value
+            ''',
+            [key + (value,) for key, value in pending.items()]
+        )
+
+    def merge_pending(self, rows: dict, pending: dict, key) -> dict:
+        for pending_key, value in pending.items():
+            group = key(pending_key)
+            if group is not None:
+                rows[group] = rows.get(group, 0) + value
+        return rows
+
+    async def totals(self) -> dict:
+        pending = dict(self.pending)
+        rows = dict(await self.store.fetchall('SELECT name, SUM(value) FROM counters GROUP BY name'))
+        return self.merge_pending(rows, pending, lambda pending_key: pending_key[3])
+
+    async def series(self, name: str, hours: int = 48) -> list:
+        now = int(time.time() // 3600)
+        pending = dict(self.pending)
+        rows = dict(await self.store.fetchall(
+            'SELECT hour, SUM(value) FROM counters WHERE name = ? AND hour > ? GROUP BY hour',
+            (name, now - hours)
+        ))
+        self.merge_pending(rows, pending, lambda pending_key: pending_key[0] if pending_key[3] == name else None)
+        return [rows.get(hour, 0) for hour in range(now - hours + 1, now + 1)]
+
+    async def by_country(self, name: str, hours: int = 24, limit: int = 5) -> list:
+        now = int(time.time() // 3600)
+        pending = dict(self.pending)
+        rows = dict(await self.store.fetchall(
+            "SELECT country, SUM(value) FROM counters WHERE name = ? AND hour > ? AND country != '' GROUP BY country",
+            (name, now - hours)
+        ))
+        self.merge_pending(rows, pending, lambda pending_key: pending_key[2] if pending_key[3] == name and pending_key[2] and pending_key[0] > now - hours else None)
+        return sorted(rows.items(), key = lambda item: item[1], reverse = True)[:limit]
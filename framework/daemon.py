@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+
+from telethon import TelegramClient
+
+from framework.database import Settings
+from framework.engine import Engine, create_verdict_cache, create_known_bad, create_reputation
+from framework.metrics import metrics
+from framework.audit import AuditLog
+from framework.counters import CounterStore
+from framework.bus import BREAKS, TAGS, EventBus, count_record, render_text
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'msg': record.getMessage()
+        }
+        payload.update(getattr(record, 'fields', {}))
+        return json.dumps(payload, default = str)
+
+def create_logger(log_file: str = None) -> logging.Logger:
+    logger = logging.getLogger('jeetblock')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    handler = logging.FileHandler(log_file, encoding = 'utf-8') if log_file else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+
+    return logger
+
+def structured_log(logger: logging.Logger):
+    def log(text: str, **fields) -> None:
+        message = ' '.join(TAGS.sub('', BREAKS.sub(' ', text)).split())
+        level = logging.ERROR if fields.get('event') == 'error' else logging.INFO
+        logger.log(level, message, extra = {'fields': fields})
+
+    return log
+
+def record_sink(logger: logging.Logger):
+    def sink(record) -> None:
+        level = logging.ERROR if record.kind in ('error', 'fault') else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, render_text(record), extra = {'fields': {'event': record.kind, 'account': record.account, **record.fields}})
+
+    return sink
+
+def account_configs(conf: dict, session: str = 'Me') -> list:
+    accounts = conf.get('accounts') or [{'session': session}]
+    shared = {key: value for key, value in conf.items() if key != 'accounts'}
+    return [{**shared, **account} for account in accounts]
+
+async def run(conf: dict, session: str = 'Me', sweep: bool = False, log_file: str = None) -> None:
+    logger = create_logger(log_file)
+    log = structured_log(logger)
+
+    settings = Settings()
+    settings.subscribe_errors(lambda error: log(f'Could not save settings, change reverted: {str(error)}', event = 'error'))
+    verdicts = create_verdict_cache(settings, conf)
+    known_bad = create_known_bad(settings)
+    audit = AuditLog(settings.db_path)
+    reputation = create_reputation(conf)
+    persisted = CounterStore(settings.db_path, flush_interval = conf.get('counter_flush_interval', 30))
+    bus = EventBus(settings)
+    bus.add_sink(record_sink(logger))
+    bus.add_sink(count_record, filtered = False)
+    counters = {}
+    engines = []
+
+    for account in account_configs(conf, session):
+        name = account['session']
+        counters[name] = {}
+
+        def increment(key: str, name = name) -> None:
+            counters[name][key] = counters[name].get(key, 0) + 1
+
+        client = TelegramClient(name, account['api_id'], account['api_hash'], sequential_updates = True)
+        engines.append(Engine(
+            client, settings, verdicts, account,
+            bus = bus,
+            increment = increment,
+            account = name,
+            known_bad = known_bad,
+            audit = audit,
+            reputation = reputation,
+            counters = persisted
+        ))
+
+    started = time.monotonic()
+    lag_sampler = asyncio.ensure_future(metrics.sample_loop_lag())
+    server = await metrics.serve(conf['metrics_port']) if conf.get('metrics_port') else None
+
+    results = await asyncio.gather(*(engine.start(sweep = sweep) for engine in engines), return_exceptions = True)
+    for engine, result in zip(list(engines), results):
+        if isinstance(result, Exception):
+            log(f'Could not start account: {str(result)}', event = 'error', account = engine.account)
+            engines.remove(engine)
+
+    log('Headless Engine Started', event = 'startup', accounts = [engine.account for engine in engines])
+    if not engines:
+        return
+
+    stopping = asyncio.get_running_loop().create_future()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signum, lambda: stopping.done() or stopping.set_result(None))
+        except NotImplementedError:
+            pass
+
+    disconnected = asyncio.gather(*(engine.client.run_until_disconnected() for engine in engines), return_exceptions = True)
+    await asyncio.wait([disconnected, stopping], return_when = asyncio.FIRST_COMPLETED)
+
+    await asyncio.gather(*(engine.stop() for engine in engines), return_exceptions = True)
+    audit.close()
+    persisted.flush()
+    settings.close()
+    lag_sampler.cancel()
+    if server is not None:
+        server.close()
+    log('Headless Engine Stopped', event = 'shutdown', uptime = round(time.monotonic() - started), counters = counters, cache = verdicts.stats())
@@ -1,13 +1,56 @@
 import json
-import sqlite3
+import asyncio
+import threading
+from functools import partial
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from framework.store import get_store
+from framework.rules import Rule, validate_rule
+
+class SettingsSnapshot(NamedTuple):
+    countries: frozenset
+    delete_chat: bool
+    block_user: bool
+    log_user_info: bool
+    log_block: bool
+    log_delete: bool
+    log_errors: bool
+    rules: tuple = ()
+    allowed: frozenset = frozenset()
+
+def revert_snapshot(current: SettingsSnapshot, old: SettingsSnapshot, new: SettingsSnapshot) -> SettingsSnapshot:
+    changes = {}
+    for field in SettingsSnapshot._fields:
+        was, became, now = getattr(old, field), getattr(new, field), getattr(current, field)
+        if was == became:
+            continue
+
+        if isinstance(now, (frozenset, tuple)):
+            reverted = (set(now) - (set(became) - set(was))) | (set(was) - set(became))
+            changes[field] = frozenset(reverted) if isinstance(now, frozenset) else tuple(sorted(reverted))
+        elif now == became:
+            changes[field] = was
+
+    return current._replace(**changes)
 
 class Settings:
     def __init__(self, db_path: str = 'settings.db'):
         self.db_path = db_path
-        self.__init_db__()
-
-    def __init_db__(self) -> None:
-        conn = sqlite3.connect(self.db_path)
+        self.subscribers = []
+        self.error_handlers = []
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.pending = None
+        self.staged = []
+        self.snapshot = None
+        self.next_rule_id = 1
+
+        self.store = get_store(db_path)
+        self.store.call(self.__init_db__)
+        self.snapshot = self.store.call(self.__load__)
+
+    def __init_db__(self, conn) -> None:
         curs = conn.cursor()
 
         curs.execute('''
@@ -26,155 +69,255 @@ class Settings:
         if curs.fetchone()[0] == 0:
             curs.execute('INSERT INTO settings DEFAULT VALUES')
 
-        conn.commit()
-        conn.close()
-
-    def add_countries(self, countries: list = []) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+        curs.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'countries'")
+        migrate = curs.fetchone()[0] == 0
 
-        current = self.get_countries()
-        updated = list(set(current + countries))
-        curs.execute('UPDATE settings SET countries = ?', (json.dumps(updated),))
+        curs.execute('''
+            CREATE TABLE IF NOT EXISTS countries (
+                code TEXT PRIMARY KEY
+            ) WITHOUT ROWID
+        ''')
 
-        conn.commit()
-        conn.close()
+        if migrate:
+            curs.execute('SELECT countries FROM settings')
+            legacy = json.loads(curs.fetchone()[0] or '[]')
+            curs.executemany('INSERT OR IGNORE INTO countries (code) VALUES (?)', [(code,) for code in legacy])
+            curs.execute("UPDATE settings SET countries = '[]'")
 
-    def remove_countries(self, countries: list = []) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+        curs.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'rules'")
+        seed = curs.fetchone()[0] == 0
 
-        current = self.get_countries()
-        updated = current
-        for country in countries:
-            if country in updated:
-                updated.remove(country)
+        curs.execute('''
+            CREATE TABLE IF NOT EXISTS rules (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                enabled INTEGER DEFAULT 1,
+                definition TEXT NOT NULL
+            )
+        ''')
 
-        curs.execute('UPDATE settings SET countries = ?', (json.dumps(updated),))
+        curs.execute('''
+            CREATE TABLE IF NOT EXISTS allowlist (
+                user_id INTEGER PRIMARY KEY
+            )
+        ''')
 
-        conn.commit()
-        conn.close()
+        if seed:
+            curs.execute(
+                'INSERT INTO rules (name, enabled, definition) VALUES (?, 1, ?)',
+                ('Blocked Countries', json.dumps({'countries': 'blocked'}))
+            )
 
-    def configure_delete_chat(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
+    def __load__(self, conn) -> SettingsSnapshot:
         curs = conn.cursor()
 
-        curs.execute('UPDATE settings SET delete_chat = ?', (1 if enable else 0,))
+        curs.execute('SELECT delete_chat, block_user, log_user_info, log_block, log_delete, log_errors FROM settings')
+        row = curs.fetchone()
+
+        curs.execute('SELECT code FROM countries')
+        countries = frozenset(code for code, in curs.fetchall())
+
+        curs.execute('SELECT id, name, enabled, definition FROM rules ORDER BY id')
+        rules = tuple(Rule(rule_id, name, bool(enabled), definition) for rule_id, name, enabled, definition in curs.fetchall())
+
+        curs.execute('SELECT user_id FROM allowlist')
+        allowed = frozenset(user_id for user_id, in curs.fetchall())
+
+        curs.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name = 'rules'")
+        self.next_rule_id = max([rule.id for rule in rules] + [curs.fetchone()[0] or 0]) + 1
+
+        return SettingsSnapshot(countries, *(bool(value) for value in row), rules = rules, allowed = allowed)
+
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            if self.depth == 0:
+                self.pending = self.snapshot
+                self.staged = []
+
+            self.depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.pending = None
+                    self.staged = []
+                raise
+
+            self.depth -= 1
+            if self.depth > 0:
+                return
+
+            staged, self.staged = self.staged, []
+            if staged:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = None
+
+                written = self.store.submit(lambda conn: [conn.executemany(statement, rows) for statement, rows in staged])
+                written.add_done_callback(partial(self.__written__, loop, self.snapshot, self.pending))
+
+            old, new, self.pending = self.snapshot, self.pending, None
+            if new == old:
+                return
+
+            self.snapshot = new
+
+        for callback in self.subscribers:
+            callback(old, new)
+
+    def __on_loop__(self, loop, callback, *args) -> None:
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(callback, *args)
+        else:
+            callback(*args)
+
+    def __written__(self, loop, old: SettingsSnapshot, new: SettingsSnapshot, future) -> None:
+        if future.exception() is not None:
+            self.__on_loop__(loop, self.__failed__, future.exception(), old, new)
+
+    def __failed__(self, error: Exception, old: SettingsSnapshot, new: SettingsSnapshot) -> None:
+        with self.lock:
+            current, self.snapshot = self.snapshot, revert_snapshot(self.snapshot, old, new)
+            if self.depth > 0:
+                self.pending = revert_snapshot(self.pending, old, new)
+
+        for handler in self.error_handlers:
+            handler(error)
+
+        if current != self.snapshot:
+            for callback in self.subscribers:
+                callback(current, self.snapshot)
+
+    def stage(self, statement: str, rows: list) -> None:
+        if rows:
+            self.staged.append((statement, rows))
+
+    def __write__(self, **changes) -> None:
+        with self.batch():
+            self.stage(
+                'UPDATE settings SET ' + ', '.join(f'{key} = ?' for key in changes),
+                [tuple(int(value) for value in changes.values())]
+            )
+            self.pending = self.pending._replace(**{key: bool(value) for key, value in changes.items()})
 
-        conn.commit()
-        conn.close()
+    def flush(self) -> None:
+        self.store.flush()
 
-    def configure_block_user(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('UPDATE settings SET block_user = ?', (1 if enable else 0,))
+    def close(self) -> None:
+        self.store.close()
 
-        conn.commit()
-        conn.close()
+    def subscribe(self, callback) -> None:
+        self.subscribers.append(callback)
 
-    def configure_log_user_info(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+    def subscribe_errors(self, callback) -> None:
+        self.error_handlers.append(callback)
 
-        curs.execute('UPDATE settings SET log_user_info = ?', (1 if enable else 0,))
+    def unsubscribe(self, callback) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
 
-        conn.commit()
-        conn.close()
+    def add_countries(self, countries: list = []) -> None:
+        with self.batch():
+            self.stage('INSERT OR IGNORE INTO countries (code) VALUES (?)', [(code,) for code in countries])
+            self.pending = self.pending._replace(countries = self.pending.countries.union(countries))
 
-    def configure_log_block(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+    def remove_countries(self, countries: list = []) -> None:
+        with self.batch():
+            self.stage('DELETE FROM countries WHERE code = ?', [(code,) for code in countries])
+            self.pending = self.pending._replace(countries = self.pending.countries.difference(countries))
+
+    def set_countries(self, countries: list = []) -> tuple:
+        countries = frozenset(countries)
+        with self.batch():
+            added = countries - self.pending.countries
+            removed = self.pending.countries - countries
+            self.stage('INSERT OR IGNORE INTO countries (code) VALUES (?)', [(code,) for code in added])
+            self.stage('DELETE FROM countries WHERE code = ?', [(code,) for code in removed])
+            self.pending = self.pending._replace(countries = countries)
+
+        return added, removed
+
+    def save_rule(self, name: str, definition: str, enabled: bool = True, rule_id: int = None) -> int:
+        validate_rule(definition)
+
+        with self.batch():
+            if rule_id is None:
+                rule_id, self.next_rule_id = self.next_rule_id, self.next_rule_id + 1
+                self.stage(
+                    'INSERT INTO rules (id, name, enabled, definition) VALUES (?, ?, ?, ?)',
+                    [(rule_id, name, int(enabled), definition)]
+                )
+            else:
+                self.stage(
+                    'UPDATE rules SET name = ?, enabled = ?, definition = ? WHERE id = ?',
+                    [(name, int(enabled), definition, rule_id)]
+                )
+
+            rule = Rule(rule_id, name, bool(enabled), definition)
+            rules = [existing for existing in self.pending.rules if existing.id != rule_id] + [rule]
+            self.pending = self.pending._replace(rules = tuple(sorted(rules)))
+
+        return rule_id
+
+    def delete_rule(self, rule_id: int) -> None:
+        with self.batch():
+            self.stage('DELETE FROM rules WHERE id = ?', [(rule_id,)])
+            self.pending = self.pending._replace(rules = tuple(rule for rule in self.pending.rules if rule.id != rule_id))
+
+    def allow_users(self, user_ids: list = []) -> None:
+        with self.batch():
+            self.stage('INSERT OR IGNORE INTO allowlist (user_id) VALUES (?)', [(int(user_id),) for user_id in user_ids])
+            self.pending = self.pending._replace(allowed = self.pending.allowed.union(int(user_id) for user_id in user_ids))
+
+    def disallow_users(self, user_ids: list = []) -> None:
+        with self.batch():
+            self.stage('DELETE FROM allowlist WHERE user_id = ?', [(int(user_id),) for user_id in user_ids])
+            self.pending = self.pending._replace(allowed = self.pending.allowed.difference(int(user_id) for user_id in user_ids))
+
+    def get_allowed(self) -> frozenset:
+        return self.snapshot.allowed
+
+    def get_rules(self) -> tuple:
+        return self.snapshot.rules
 
-        curs.execute('UPDATE settings SET log_block = ?', (1 if enable else 0,))
+    def configure_delete_chat(self, enable: bool) -> None:
+        self.__write__(delete_chat = enable)
 
-        conn.commit()
-        conn.close()
+    def configure_block_user(self, enable: bool) -> None:
+        self.__write__(block_user = enable)
 
-    def configure_log_delete(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+    def configure_log_user_info(self, enable: bool) -> None:
+        self.__write__(log_user_info = enable)
 
-        curs.execute('UPDATE settings SET log_delete = ?', (1 if enable else 0,))
+    def configure_log_block(self, enable: bool) -> None:
+        self.__write__(log_block = enable)
 
-        conn.commit()
-        conn.close()
+    def configure_log_delete(self, enable: bool) -> None:
+        self.__write__(log_delete = enable)
 
     def configure_log_errors(self, enable: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('UPDATE settings SET log_errors = ?', (1 if enable else 0,))
-
-        conn.commit()
-        conn.close()
+        self.__write__(log_errors = enable)
 
     def get_delete_chat(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('SELECT delete_chat FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
+        return self.snapshot.delete_chat
 
     def get_block_user(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('SELECT block_user FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
+        return self.snapshot.block_user
 
     def get_log_user_info(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-        
-        curs.execute('SELECT log_user_info FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
+        return self.snapshot.log_user_info
 
     def get_log_block(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('SELECT log_block FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
+        return self.snapshot.log_block
 
     def get_log_delete(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('SELECT log_delete FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
+        return self.snapshot.log_delete
 
     def get_log_errors(self) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
-
-        curs.execute('SELECT log_errors FROM settings')
-        result = curs.fetchone()[0]
-        conn.close()
-
-        return bool(result)
-
-    def get_countries(self) -> list:
-        conn = sqlite3.connect(self.db_path)
-        curs = conn.cursor()
+        return self.snapshot.log_errors
 
-        curs.execute('SELECT countries FROM settings')
-        result = json.loads(curs.fetchone()[0])
-        conn.close()
-        
-        return result
+    def get_countries(self) -> frozenset:
+        return self.snapshot.countries
@@ -0,0 +1,450 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+from telethon import TelegramClient, events, functions
+from telethon.tl.types import PeerUser
+
+from framework.database import Settings
+from framework.cache import Verdict, VerdictCache
+from framework.actions import ActionExecutor, ActionQueue, Postponed
+from framework.sweep import DialogSweep
+from framework.metrics import metrics
+from framework.rules import RuleSet, RuleContext, sender_name
+from framework.allowlist import Allowlist
+from framework.audit import AuditLog
+from framework.reputation import Reputation
+from framework.bus import EventBus
+from framework.counters import CounterStore
+from framework.intake import Intake
+from framework.entities import EntityCache
+
+def discard(*args, **kwargs) -> None:
+    pass
+
+class Engine:
+    def __init__(self, client: TelegramClient, settings: Settings, verdicts: VerdictCache, conf: dict, bus: EventBus = None, increment = discard, account: str = '', known_bad: set = None, audit: AuditLog = None, reputation: Reputation = None, counters: CounterStore = None) -> None:
+        self.client = client
+        self.settings = settings
+        self.verdicts = verdicts
+        self.account = account
+        self.known_bad = set() if known_bad is None else known_bad
+        self.audit = AuditLog(settings.db_path) if audit is None else audit
+        self.reputation = create_reputation(conf) if reputation is None else reputation
+        self.counters = CounterStore(settings.db_path) if counters is None else counters
+        self.conf = conf
+        self.bus = EventBus(settings) if bus is None else bus
+        self.events = self.bus.bind(account)
+        self.increment = increment
+
+        self.executor = ActionExecutor(
+            client,
+            concurrency = conf.get('action_concurrency', 4),
+            rates = {method: tuple(rate) for method, rate in conf.get('action_rates', {}).items()},
+            default_rate = tuple(conf.get('action_default_rate', (3.0, 5)))
+        )
+        self.queue = ActionQueue(settings.db_path, account = account)
+        self.entities = EntityCache(
+            self.executor,
+            max_size = conf.get('entity_cache_size', 5000),
+            batch_size = conf.get('entity_batch_size', 100),
+            account = account
+        )
+        self.allowlist = Allowlist(client, self.executor, refresh = conf.get('allowlist_refresh', 600))
+        self.sweep = DialogSweep(
+            client,
+            self.sweep_detect,
+            self.sweep_match,
+            db_path = settings.db_path,
+            account = account,
+            batch_size = conf.get('sweep_batch_size', 50)
+        )
+
+        self.drain_wakeup = None
+        self.allowlist_ready = None
+        self.allowlist_retry = conf.get('allowlist_retry', 30)
+        self.tasks = []
+        self.ruleset = None
+        self.ruleset_source = None
+
+        self.inflight = {}
+        self.actioned = OrderedDict()
+        self.cooldown = conf.get('action_cooldown', 300)
+
+        self.intake = Intake(
+            self.timed_process,
+            max_pending = conf.get('intake_size', 1000),
+            workers = conf.get('intake_workers', 32),
+            degrade_depth = conf.get('degrade_depth', 200),
+            degrade_lag = conf.get('degrade_lag', 0.25),
+            recover_after = conf.get('degrade_recover', 10),
+            on_change = self.load_changed
+        )
+        self.defer_delay = conf.get('degrade_defer', 60)
+        self.flood_defer = conf.get('flood_defer', 5)
+        self.deferred = 0
+
+        settings.subscribe(self.forget_allowed)
+
+        metrics.gauge('jeetblock_allowlist_size', lambda: len(self.allowlist), account = account)
+        metrics.gauge('jeetblock_action_queue_depth', lambda: self.executor.waiting, account = account)
+        metrics.gauge('jeetblock_actions_in_flight', lambda: self.executor.running, account = account)
+        metrics.gauge('jeetblock_intake_depth', self.intake.depth, account = account)
+        metrics.gauge('jeetblock_degraded', lambda: int(self.intake.degraded), account = account)
+
+    def compiled_rules(self, snapshot) -> RuleSet:
+        if self.ruleset_source is not snapshot.rules:
+            self.ruleset = RuleSet(snapshot.rules)
+            self.ruleset_source = snapshot.rules
+        return self.ruleset
+
+    async def lookup_country(self, sender_id: int, snapshot):
+        verdict = self.verdicts.get(sender_id)
+        if verdict is not None:
+            return verdict
+
+        result = await self.executor.call(functions.messages.GetPeerSettingsRequest(
+            peer = PeerUser(sender_id)
+        ))
+
+        if not hasattr(result.settings, 'phone_country'):
+            self.events.emit(
+                'error',
+                message = "There was no 'phone_country' attribute in the 'GetPeerSettingsRequest' class. This is likely because the version of Telethon you're using is outdated. Please update your client by uninstalling telethon, and running:<br><br>pip install git+https://github.com/LonamiWebs/Telethon.git@67765f84a58598cee3fa52abeea9a1f76c993fdd<br>",
+                sender_id = sender_id
+            )
+            return None
+
+        phone_country = result.settings.phone_country
+        return self.verdicts.put(sender_id, phone_country)
+
+    async def detect(self, sender_id: int, snapshot, sender = None, text: str = ''):
+        started = time.perf_counter()
+        if sender_id in self.known_bad or sender_id in self.reputation:
+            verdict = self.verdicts.entries.get(sender_id) or Verdict(None)
+            rule = 'Known Threat' if sender_id in self.known_bad else 'Reputation'
+        else:
+            ruleset = self.compiled_rules(snapshot)
+            context = RuleContext(sender_id, sender, text)
+
+            rule, pending = ruleset.match_cheap(context, snapshot)
+            verdict = None
+            if rule is None:
+                if not pending:
+                    return None
+
+                verdict = await self.lookup_country(sender_id, snapshot)
+                if verdict is None:
+                    return None
+
+                rule = ruleset.match_country(pending, context, verdict.phone_country, snapshot)
+                if rule is None:
+                    return None
+
+            verdict = verdict or self.verdicts.entries.get(sender_id) or Verdict(None)
+            self.known_bad.add(sender_id)
+
+        self.events.emit('detection', sender_id = sender_id, country = verdict.phone_country, rule = rule)
+        self.counters.increment('Detected', verdict.phone_country, self.account)
+        self.audit.record(sender_id, 'detect', verdict.phone_country, rule, time.perf_counter() - started, account = self.account, username = getattr(sender, 'username', None))
+        return verdict
+
+    def planned_actions(self, snapshot) -> list:
+        return [action for action, enabled in (('block', snapshot.block_user), ('delete', snapshot.delete_chat)) if enabled]
+
+    def recently_actioned(self, sender_id: int) -> bool:
+        actioned = self.actioned.get(sender_id)
+        if actioned is None:
+            return False
+
+        if time.monotonic() - actioned < self.cooldown:
+            return True
+
+        del self.actioned[sender_id]
+        return False
+
+    def mark_actioned(self, sender_id: int) -> None:
+        now = time.monotonic()
+        self.actioned[sender_id] = now
+        self.actioned.move_to_end(sender_id)
+
+        while self.actioned:
+            oldest = next(iter(self.actioned.values()))
+            if now - oldest < self.cooldown:
+                break
+            self.actioned.popitem(last = False)
+
+    def is_allowed(self, sender_id: int) -> bool:
+        return sender_id in self.settings.snapshot.allowed or sender_id in self.allowlist
+
+    async def sweep_detect(self, sender_id: int, sender = None, text: str = ''):
+        if self.is_allowed(sender_id):
+            return None
+        await self.intake.wait_normal()
+        return await self.detect(sender_id, self.settings.snapshot, self.entities.remember(sender), text)
+
+    async def handle_message(self, event):
+        if not event.is_private:
+            return
+
+        sender_id = event.sender_id
+        if self.is_allowed(sender_id):
+            metrics.inc('jeetblock_allowlisted_total')
+            return
+
+        if self.recently_actioned(sender_id):
+            metrics.inc('jeetblock_coalesced_total', reason = 'cooldown')
+            return
+
+        running = self.inflight.get(sender_id)
+        if running is not None:
+            metrics.inc('jeetblock_coalesced_total', reason = 'inflight')
+            return running
+
+        done = asyncio.get_running_loop().create_future()
+        done.add_done_callback(lambda future: self.processed(sender_id, future))
+        self.inflight[sender_id] = done
+        try:
+            await self.intake.put(event, done)
+        except BaseException:
+            done.cancel()
+            raise
+        return done
+
+    def processed(self, sender_id: int, future: asyncio.Future) -> None:
+        self.inflight.pop(sender_id, None)
+        if not future.cancelled() and future.exception() is not None:
+            self.events.emit('fault', message = f'Could not process message from {sender_id}: {str(future.exception())}', sender_id = sender_id)
+
+    async def timed_process(self, event):
+        with metrics.timer('total'):
+            await self.process_message(event)
+
+    async def process_message(self, event):
+        if not self.allowlist_ready.is_set():
+            await self.allowlist_ready.wait()
+            if self.is_allowed(event.sender_id):
+                metrics.inc('jeetblock_allowlisted_total')
+                return
+
+        snapshot = self.settings.snapshot
+        sender = self.entities.remember(event.sender) or self.entities.peek(event.sender_id)
+        with metrics.timer('lookup'):
+            verdict = await self.detect(event.sender_id, snapshot, sender, event.message.message)
+        if verdict is None:
+            return
+
+        if self.events.enabled('user_info') and not self.intake.degraded:
+            if sender is not None:
+                self.log_user_info(event.sender_id, sender)
+            else:
+                asyncio.ensure_future(self.fetch_user_info(event.sender_id))
+
+        actions = self.planned_actions(snapshot)
+        if not actions:
+            return
+
+        deferred = []
+        if self.intake.degraded and 'block' in actions and 'delete' in actions:
+            actions, deferred = ['block'], ['delete']
+            self.deferred += 1
+            metrics.inc('jeetblock_deferred_total', action = 'delete')
+
+        with metrics.timer('enqueue'):
+            if deferred:
+                await asyncio.gather(
+                    self.queue.enqueue(event.sender_id, actions),
+                    self.queue.enqueue(event.sender_id, deferred, leased = False, delay = self.defer_delay)
+                )
+            else:
+                await self.queue.enqueue(event.sender_id, actions)
+        timings = {}
+        with metrics.timer('actions'):
+            results = await self.executor.run(event.sender_id, actions, timings, self.flood_defer)
+        with metrics.timer('complete'):
+            await self.queue.complete(event.sender_id, results)
+        self.report(event.sender_id, results, timings)
+        self.wake_drain_after(results)
+
+    def log_user_info(self, sender_id: int, sender) -> None:
+        self.events.emit(
+            'user_info',
+            sender_id = sender_id,
+            username = sender.username,
+            name = sender_name(sender),
+            premium = sender.premium,
+            photo = sender.photo
+        )
+
+    async def fetch_user_info(self, sender_id: int) -> None:
+        try:
+            sender = await self.entities.get(sender_id)
+        except Exception as E:
+            self.events.emit('error', message = f'Could not load user info for {sender_id}: {str(E)}', sender_id = sender_id)
+            return
+
+        if sender is not None:
+            self.log_user_info(sender_id, sender)
+
+    def report(self, sender_id: int, results: dict, timings: dict = {}) -> None:
+        verdict = self.verdicts.entries.get(sender_id)
+        country = verdict.phone_country if verdict is not None else None
+        sender = self.entities.peek(sender_id)
+
+        for action, counter in (('block', 'Blocked'), ('delete', 'Deleted')):
+            if action not in results:
+                continue
+
+            if isinstance(results[action], Postponed):
+                self.mark_actioned(sender_id)
+                metrics.inc('jeetblock_postponed_total', action = action)
+                continue
+
+            self.audit.record(
+                sender_id, action, country,
+                latency = timings.get(action),
+                error = None if results[action] is None else str(results[action]),
+                account = self.account,
+                username = getattr(sender, 'username', None)
+            )
+
+            if results[action] is not None:
+                self.events.emit('error', message = f'Could not {action} {sender_id}: {str(results[action])}', sender_id = sender_id, action = action)
+                continue
+
+            self.mark_actioned(sender_id)
+            if action == 'block':
+                self.reputation.add(sender_id)
+            self.increment(counter)
+            self.counters.increment(counter, country, self.account)
+            self.events.emit(action, sender_id = sender_id, country = country)
+
+    def wake_drain_after(self, results: dict) -> None:
+        postponed = [error.seconds for error in results.values() if isinstance(error, Postponed)]
+        if postponed and self.drain_wakeup is not None:
+            asyncio.get_running_loop().call_later(min(postponed), self.drain_wakeup.set)
+
+    async def drain_queue(self, interval: float = 60) -> None:
+        await self.allowlist_ready.wait()
+        while True:
+            if not self.intake.degraded:
+                drained = await self.queue.drain(self.executor, self.report)
+                if drained:
+                    self.events.emit('queue', drained = drained)
+
+            self.drain_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.drain_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sweep_match(self, sender_id: int, verdict) -> None:
+        actions = self.planned_actions(self.settings.snapshot)
+        if actions:
+            await self.queue.enqueue(sender_id, actions, leased = False)
+            self.drain_wakeup.set()
+
+    def sweep_progress(self, processed: int, matched: int) -> None:
+        self.events.emit('sweep_progress', processed = processed, matched = matched)
+
+    async def sweep_dialogs(self) -> None:
+        await self.allowlist_ready.wait()
+        self.events.emit('sweep_start', mode = 'Resuming' if await self.sweep.in_progress() else 'Starting')
+
+        try:
+            result = await self.sweep.run(self.sweep_progress)
+        except Exception as E:
+            self.events.emit('fault', message = f'Inbox Sweep Stopped: {str(E)}')
+            return
+
+        self.events.emit('sweep_done', **result)
+
+    async def load_allowlist(self) -> None:
+        while True:
+            try:
+                loaded = await self.allowlist.load()
+                break
+            except Exception as E:
+                self.events.emit('fault', message = f'Could not load allowlist, retrying in {self.allowlist_retry}s: {str(E)}')
+                await asyncio.sleep(self.allowlist_retry)
+
+        self.events.emit('allowlist', size = loaded)
+        self.allowlist_ready.set()
+
+    def allowlist_error(self, error: Exception) -> None:
+        self.events.emit('fault', message = f'Could not refresh contacts: {str(error)}')
+
+    def load_changed(self, degraded: bool, depth: int, lag: float) -> None:
+        if degraded:
+            self.bus.shed(self.account, True)
+            self.events.emit('degraded', depth = depth, lag = lag * 1000)
+            return
+
+        skipped = self.bus.shed(self.account, False)
+        deferred, self.deferred = self.deferred, 0
+        self.events.emit('recovered', skipped = skipped, deferred = deferred)
+        if self.drain_wakeup is not None:
+            self.drain_wakeup.set()
+
+    def forget_allowed(self, old, new) -> None:
+        if new.allowed - old.allowed:
+            self.reputation.remove(new.allowed - old.allowed)
+
+    def reputation_error(self, error: Exception) -> None:
+        self.events.emit('fault', message = f'Could not update reputation file: {str(error)}')
+
+    async def start(self, sweep: bool = False) -> None:
+        await self.client.start()
+
+        self.events.emit('startup', reputation = len(self.reputation), **self.verdicts.stats())
+
+        await self.queue.release()
+        self.drain_wakeup = asyncio.Event()
+        self.allowlist_ready = asyncio.Event()
+        self.intake.start()
+        self.client.add_event_handler(self.handle_message, events.NewMessage(incoming = True))
+        self.allowlist.attach()
+        self.tasks.append(asyncio.ensure_future(self.drain_queue()))
+        self.tasks.append(asyncio.ensure_future(self.load_allowlist()))
+        self.tasks.append(asyncio.ensure_future(self.allowlist.refresh_contacts(self.allowlist_error)))
+        self.tasks.append(asyncio.ensure_future(self.reputation.run(self.conf.get('reputation_refresh', 30), self.reputation_error)))
+
+        if sweep or await self.sweep.in_progress():
+            self.tasks.append(asyncio.ensure_future(self.sweep_dialogs()))
+
+    async def stop(self) -> None:
+        self.client.remove_event_handler(self.handle_message, events.NewMessage)
+        self.allowlist.detach()
+        self.intake.stop()
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.audit.flush()
+        self.counters.flush()
+
+        try:
+            await asyncio.to_thread(self.reputation.refresh)
+        except Exception as E:
+            self.reputation_error(E)
+
+        await self.client.disconnect()
+
+def create_verdict_cache(settings: Settings, conf: dict) -> VerdictCache:
+    return VerdictCache(
+        settings.db_path,
+        max_size = conf.get('cache_size', 10000),
+        ttl = conf.get('cache_ttl', 86400)
+    )
+
+def create_reputation(conf: dict) -> Reputation:
+    return Reputation(conf.get('reputation_file', 'reputation.bin'), learn = conf.get('reputation_learn', True))
+
+def create_known_bad(settings: Settings) -> set:
+    known_bad = set()
+
+    def forget_known_bad(old, new):
+        if old.countries - new.countries or old.rules != new.rules:
+            known_bad.clear()
+
+    settings.subscribe(forget_known_bad)
+    return known_bad
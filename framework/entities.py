@@ -0,0 +1,106 @@
+import asyncio
+from collections import OrderedDict
+from typing import NamedTuple
+
+from telethon import functions
+
+from framework.metrics import metrics
+
+class Entity(NamedTuple):
+    id: int
+    username: str
+    first_name: str
+    last_name: str
+    premium: bool
+    photo: bool
+
+def entity_from(user) -> Entity:
+    return Entity(
+        user.id,
+        getattr(user, 'username', None),
+        getattr(user, 'first_name', None),
+        getattr(user, 'last_name', None),
+        bool(getattr(user, 'premium', False)),
+        getattr(user, 'photo', None) is not None
+    )
+
+class EntityCache:
+    def __init__(self, executor, max_size: int = 5000, batch_size: int = 100, batch_delay: float = 0.05, account: str = '') -> None:
+        self.executor = executor
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.entries = OrderedDict()
+        self.waiting = {}
+        self.scheduled = None
+        self.hits = 0
+        self.misses = 0
+
+        metrics.gauge('jeetblock_entity_cache_hits', lambda: self.hits, account = account)
+        metrics.gauge('jeetblock_entity_cache_misses', lambda: self.misses, account = account)
+        metrics.gauge('jeetblock_entity_cache_size', lambda: len(self.entries), account = account)
+
+    def remember(self, user) -> Entity:
+        if user is None or getattr(user, 'id', None) is None:
+            return None
+
+        if getattr(user, 'min', False) and user.id in self.entries:
+            return self.entries[user.id]
+
+        entity = entity_from(user)
+        self.entries[user.id] = entity
+        self.entries.move_to_end(user.id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+        return entity
+
+    def peek(self, user_id: int) -> Entity:
+        return self.entries.get(user_id)
+
+    async def get(self, user_id: int) -> Entity:
+        entity = self.entries.get(user_id)
+        if entity is not None:
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entity
+
+        self.misses += 1
+        future = self.waiting.get(user_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.waiting[user_id] = loop.create_future()
+            if len(self.waiting) >= self.batch_size:
+                self.__fetch__()
+            elif self.scheduled is None:
+                self.scheduled = loop.call_later(self.batch_delay, self.__fetch__)
+
+        return await asyncio.shield(future)
+
+    def __fetch__(self) -> None:
+        if self.scheduled is not None:
+            self.scheduled.cancel()
+            self.scheduled = None
+
+        waiting, self.waiting = self.waiting, {}
+        if waiting:
+            asyncio.ensure_future(self.fetch(waiting))
+
+    async def fetch(self, waiting: dict) -> None:
+        try:
+            users = await self.executor.call(functions.users.GetUsersRequest(id = list(waiting)))
+        except Exception as E:
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(E)
+            return
+
+        for user in users or []:
+            self.remember(user)
+
+        for user_id, future in waiting.items():
+            if not future.done():
+                future.set_result(self.entries.get(user_id))
+
+metrics.describe('jeetblock_entity_cache_hits', 'Sender lookups answered from the entity cache.')
+metrics.describe('jeetblock_entity_cache_misses', 'Sender lookups that needed a users.GetUsers batch.')
+metrics.describe('jeetblock_entity_cache_size', 'Users held in the entity cache.')
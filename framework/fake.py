@@ -0,0 +1,86 @@
+import random
+import asyncio
+from types import SimpleNamespace
+
+from telethon.errors import FloodWaitError
+
+class FakeClient:
+    def __init__(self, countries: dict = {}, contacts: list = [], default_country: str = 'US', latency: float = 0.05, jitter: float = 0.01, error_rate: float = 0.0, flood_rate: float = 0.0, flood_seconds: int = 1, seed: int = 0) -> None:
+        self.countries = countries
+        self.contacts = contacts
+        self.default_country = default_country
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.handlers = []
+        self.disconnected = asyncio.Event()
+
+    async def start(self) -> None:
+        pass
+
+    def add_event_handler(self, callback, event = None) -> None:
+        self.handlers.append(callback)
+
+    def remove_event_handler(self, callback, event = None) -> None:
+        if callback in self.handlers:
+            self.handlers.remove(callback)
+
+    async def run_until_disconnected(self) -> None:
+        await self.disconnected.wait()
+
+    async def disconnect(self) -> None:
+        self.disconnected.set()
+
+    async def iter_dialogs(self, **kwargs):
+        for sender_id in self.countries:
+            yield SimpleNamespace(
+                entity = SimpleNamespace(id = sender_id, bot = False, is_self = False),
+                is_user = True,
+                date = None
+            )
+
+    async def __call__(self, request):
+        method = type(request).__name__
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+
+        roll = self.random.random()
+        if roll < self.flood_rate:
+            raise FloodWaitError(request, capture = self.flood_seconds)
+        if roll < self.flood_rate + self.error_rate:
+            raise RuntimeError(f'simulated {method} failure')
+
+        if method == 'GetPeerSettingsRequest':
+            return SimpleNamespace(settings = SimpleNamespace(
+                phone_country = self.countries.get(request.peer.user_id, self.default_country)
+            ))
+        if method == 'GetUsersRequest':
+            return [fake_user(user_id) for user_id in request.id]
+        if method == 'GetContactsRequest':
+            return SimpleNamespace(
+                contacts = [SimpleNamespace(user_id = user_id) for user_id in self.contacts],
+                users = []
+            )
+        return True
+
+def fake_user(user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id = user_id,
+        username = f'user{user_id}',
+        first_name = 'Fake',
+        last_name = None,
+        premium = None,
+        photo = None
+    )
+
+class FakeEvent:
+    def __init__(self, sender_id: int, text: str = '', is_private: bool = True, with_sender: bool = True) -> None:
+        self.sender_id = sender_id
+        self.is_private = is_private
+        self.message = SimpleNamespace(message = text, id = 0)
+        self.sender = fake_user(sender_id) if with_sender else None
@@ -0,0 +1,113 @@
+import time
+import asyncio
+
+from framework.metrics import metrics
+
+class Intake:
+    def __init__(self, handler, max_pending: int = 1000, workers: int = 32, degrade_depth: int = 200, degrade_lag: float = 0.25, recover_after: float = 10.0, on_change = None) -> None:
+        self.handler = handler
+        self.max_pending = max_pending
+        self.workers = workers
+        self.degrade_depth = degrade_depth
+        self.degrade_lag = degrade_lag
+        self.recover_after = recover_after
+        self.on_change = on_change
+
+        self.queue = None
+        self.normal = None
+        self.degraded = False
+        self.calm_since = None
+        self.tasks = []
+
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def __switch__(self, degraded: bool) -> None:
+        self.degraded = degraded
+        self.calm_since = None
+        if degraded:
+            self.normal.clear()
+        else:
+            self.normal.set()
+
+        metrics.inc('jeetblock_degrade_transitions_total', state = 'degraded' if degraded else 'normal')
+        if self.on_change is not None:
+            self.on_change(degraded, self.depth(), metrics.loop_lag)
+
+    def check(self) -> None:
+        depth, lag = self.depth(), metrics.loop_lag
+
+        if depth >= self.degrade_depth or lag >= self.degrade_lag:
+            self.calm_since = None
+            if not self.degraded:
+                self.__switch__(True)
+            return
+
+        if not self.degraded:
+            return
+
+        if depth > self.degrade_depth // 4 or lag >= self.degrade_lag / 2:
+            self.calm_since = None
+            return
+
+        now = time.monotonic()
+        if self.calm_since is None:
+            self.calm_since = now
+        elif now - self.calm_since >= self.recover_after:
+            self.__switch__(False)
+
+    async def put(self, event, future: asyncio.Future) -> None:
+        if self.queue.full():
+            metrics.inc('jeetblock_intake_backpressure_total')
+
+        await self.queue.put((event, future))
+        if not self.degraded and self.queue.qsize() >= self.degrade_depth:
+            self.check()
+
+    async def wait_normal(self) -> None:
+        if self.normal is not None:
+            await self.normal.wait()
+
+    async def worker(self) -> None:
+        while True:
+            event, future = await self.queue.get()
+            try:
+                if not future.done():
+                    result = await self.handler(event)
+                    if not future.done():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as E:
+                if not future.done():
+                    future.set_exception(E)
+            finally:
+                self.queue.task_done()
+
+    async def watch(self, interval: float = 0.5) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.check()
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(self.max_pending)
+        self.normal = asyncio.Event()
+        self.normal.set()
+        self.tasks = [asyncio.ensure_future(self.worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self.watch()))
+
+    def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+        while self.queue is not None and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            future.cancel()
+
+metrics.describe('jeetblock_intake_backpressure_total', 'Incoming messages that had to wait for room in the full intake queue.')
+metrics.describe('jeetblock_intake_depth', 'Incoming messages waiting for a worker.')
+metrics.describe('jeetblock_degraded', '1 while degrade mode is on.')
+metrics.describe('jeetblock_deferred_total', 'Actions postponed to the pending queue by degrade mode.')
+metrics.describe('jeetblock_degrade_transitions_total', 'Switches into and out of degrade mode.')
@@ -0,0 +1,157 @@
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return BUCKETS[index] if index < len(BUCKETS) else float('inf')
+        return float('inf')
+
+class Metrics:
+    def __init__(self) -> None:
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.help = {}
+        self.loop_lag = 0.0
+
+    def describe(self, name: str, text: str) -> None:
+        self.help[name] = text
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name: str, callback, **labels) -> None:
+        self.gauges[(name, tuple(sorted(labels.items())))] = callback
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('jeetblock_stage_seconds', time.perf_counter() - started, stage = stage)
+
+    def track_connection(self, conn, database: str = 'settings') -> None:
+        key = ('jeetblock_db_queries_total', (('database', database),))
+        counters = self.counters
+        counters.setdefault(key, 0)
+
+        def count(statement):
+            counters[key] += 1
+
+        conn.set_trace_callback(count)
+
+    async def sample_loop_lag(self, interval: float = 0.5) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, time.monotonic() - started - interval)
+            self.observe('jeetblock_loop_lag_seconds', self.loop_lag)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def render(self) -> str:
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name in typed:
+                return
+            typed.add(name)
+            if name in self.help:
+                lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def labelled(name, labels, extra = ()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return name
+            return name + '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, 'counter')
+            lines.append(f'{labelled(name, labels)} {value}')
+
+        for (name, labels), callback in sorted(self.gauges.items(), key = lambda item: item[0]):
+            header(name, 'gauge')
+            lines.append(f'{labelled(name, labels)} {callback()}')
+
+        header('jeetblock_loop_lag_last_seconds', 'gauge')
+        lines.append(f'jeetblock_loop_lag_last_seconds {self.loop_lag}')
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{labelled(name + "_bucket", labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{labelled(name + "_sum", labels)} {histogram.sum}')
+            lines.append(f'{labelled(name + "_count", labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, port: int, host: str = '127.0.0.1'):
+        async def handle(reader, writer):
+            try:
+                request = await reader.readline()
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+
+                if request.split(b' ')[1:2] in ([b'/metrics'], [b'/']):
+                    body = self.render().encode()
+                    status = b'200 OK'
+                else:
+                    body = b'not found\n'
+                    status = b'404 Not Found'
+
+                writer.write(
+                    b'HTTP/1.1 ' + status + b'\r\n'
+                    b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                    b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                    b'Connection: close\r\n\r\n' + body
+                )
+                await writer.drain()
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+metrics = Metrics()
+metrics.describe('jeetblock_stage_seconds', 'Time spent in each handle_message stage.')
+metrics.describe('jeetblock_rpc_total', 'Telegram RPCs sent, by method.')
+metrics.describe('jeetblock_rpc_seconds', 'Telegram RPC latency, by method.')
+metrics.describe('jeetblock_db_queries_total', 'SQLite statements executed.')
+metrics.describe('jeetblock_loop_lag_seconds', 'Event loop scheduling delay.')
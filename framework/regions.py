@@ -0,0 +1,84 @@
+COUNTRIES = [
+    'AF', 'AL', 'DZ', 'AD', 'AO',
+    'AG', 'AR', 'AM', 'AU', 'AT',
+    'AZ', 'BS', 'BH', 'BD', 'BB',
+    'BY', 'BE', 'BZ', 'BJ', 'BT',
+    'BO', 'BA', 'BW', 'BR', 'BN',
+    'BG', 'BF', 'BI', 'CV', 'KH',
+    'CM', 'CA', 'CF', 'TD', 'CL',
+    'CN', 'CO', 'KM', 'CD', 'CG',
+    'CR', 'CI', 'HR', 'CU', 'CY',
+    'CZ', 'DK', 'DJ', 'DM', 'DO',
+    'EC', 'EG', 'SV', 'GQ', 'ER',
+    'EE', 'SZ', 'ET', 'FJ', 'FI',
+    'FR', 'GA', 'GM', 'GE', 'DE',
+    'GH', 'GR', 'GD', 'GT', 'GN',
+    'GW', 'GY', 'HT', 'HN', 'HU',
+    'IS', 'IN', 'ID', 'IR', 'IQ',
+    'IE', 'IL', 'IT', 'JM', 'JP',
+    'JO', 'KZ', 'KE', 'KI', 'KP',
+    'KR', 'KW', 'KG', 'LA', 'LV',
+    'LB', 'LS', 'LR', 'LY', 'LI',
+    'LT', 'LU', 'MG', 'MW', 'MY',
+    'MV', 'ML', 'MT', 'MH', 'MR',
+    'MU', 'MX', 'FM', 'MD', 'MC',
+    'MN', 'ME', 'MA', 'MZ', 'MM',
+    'NA', 'NR', 'NP', 'NL', 'NZ',
+    'NI', 'NE', 'NG', 'MK', 'NO',
+    'OM', 'PK', 'PW', 'PA', 'PG',
+    'PY', 'PE', 'PH', 'PL', 'PT',
+    'QA', 'RO', 'RU', 'RW', 'KN',
+    'LC', 'VC', 'WS', 'SM', 'ST',
+    'SA', 'SN', 'RS', 'SC', 'SL',
+    'SG', 'SK', 'SI', 'SB', 'SO',
+    'ZA', 'SS', 'ES', 'LK', 'SD',
+    'SR', 'SE', 'CH', 'SY', 'TW',
+    'TJ', 'TZ', 'TH', 'TL', 'TG',
+    'TO', 'TT', 'TN', 'TR', 'TM',
+    'TV', 'UG', 'UA', 'AE', 'GB',
+    'US', 'UY', 'UZ', 'VU', 'VA',
+    'VE', 'VN', 'YE', 'ZM', 'ZW',
+    'PS', 'PR', 'RE', 'YT', 'SH', 'EH'
+]
+
+REGIONS = {
+    'North America': ('US', 'CA', 'MX'),
+    'Europe': (
+        'AL', 'AD', 'AT', 'BE', 'BA', 'BG', 'HR', 'CY', 'CZ', 'DK',
+        'EE', 'FI', 'FR', 'DE', 'GR', 'HU', 'IS', 'IE', 'IT', 'LV',
+        'LI', 'LT', 'LU', 'MT', 'MC', 'ME', 'NL', 'MK', 'NO', 'PL',
+        'PT', 'RO', 'SM', 'RS', 'SK', 'SI', 'ES', 'SE', 'CH', 'GB', 'VA'
+    ),
+    'South Asia': ('AF', 'BD', 'BT', 'IN', 'MV', 'NP', 'PK', 'LK'),
+    'Southeast Asia': ('BN', 'KH', 'ID', 'LA', 'MY', 'MM', 'PH', 'SG', 'TH', 'TL', 'VN'),
+    'Middle East': (
+        'AE', 'BH', 'EG', 'IR', 'IQ', 'IL', 'JO', 'KW', 'LB', 'OM',
+        'PS', 'QA', 'SA', 'SY', 'TR', 'YE'
+    ),
+    'CIS': ('AM', 'AZ', 'BY', 'GE', 'KZ', 'KG', 'MD', 'RU', 'TJ', 'TM', 'UA', 'UZ'),
+    'Africa': (
+        'DZ', 'AO', 'BJ', 'BW', 'BF', 'BI', 'CV', 'CM', 'CF', 'TD',
+        'KM', 'CD', 'CG', 'CI', 'DJ', 'GQ', 'ER', 'SZ', 'ET', 'GA',
+        'GM', 'GH', 'GN', 'GW', 'KE', 'LS', 'LR', 'LY', 'MG', 'MW',
+        'ML', 'MR', 'MU', 'MA', 'MZ', 'NA', 'NE', 'NG', 'RW', 'ST',
+        'SN', 'SC', 'SL', 'SO', 'ZA', 'SS', 'SD', 'TZ', 'TG', 'TN',
+        'UG', 'ZM', 'ZW', 'RE', 'YT', 'SH', 'EH'
+    )
+}
+
+PRESETS = {
+    'Allow Only US': ('allow', ('US',)),
+    'Allow Only North America': ('allow', REGIONS['North America']),
+    'Allow Only Europe + North America': ('allow', REGIONS['Europe'] + REGIONS['North America']),
+    'Block South Asia': ('block', REGIONS['South Asia']),
+    'Block Southeast Asia': ('block', REGIONS['Southeast Asia']),
+    'Block Middle East': ('block', REGIONS['Middle East']),
+    'Block CIS': ('block', REGIONS['CIS']),
+    'Block Africa': ('block', REGIONS['Africa'])
+}
+
+def apply_preset(current, name: str) -> frozenset:
+    mode, codes = PRESETS[name]
+    if mode == 'allow':
+        return frozenset(COUNTRIES).difference(codes)
+    return frozenset(current).union(codes)
@@ -0,0 +1,195 @@
+import os
+import mmap
+import struct
+import asyncio
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'JBREP\x00\x01\x00'
+HEADER = struct.Struct('=8sQ')
+
+@contextmanager
+def locked(path: str):
+    with open(f'{path}.lock', 'a+b') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def map_file(file):
+    if fcntl is not None:
+        return mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+    return file.read()
+
+def replace(source: str, target: str, attempts: int = 50, delay: float = 0.02) -> None:
+    for attempt in range(attempts):
+        try:
+            os.replace(source, target)
+            return
+        except PermissionError:
+            if fcntl is not None or attempt == attempts - 1:
+                raise
+            time.sleep(delay)
+
+def write_merged(path: str, ids, added: list, removed) -> int:
+    cuts = sorted(
+        [(bisect_left(ids, user_id), 0, user_id) for user_id in added] +
+        [(bisect_left(ids, user_id), 1, user_id) for user_id in removed]
+    )
+    count = len(ids) + len(added) - len(removed)
+    temporary = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, count))
+            start = 0
+            for position, kind, user_id in cuts:
+                file.write(ids[start:position])
+                if kind == 0:
+                    file.write(array('q', (user_id,)).tobytes())
+                    start = position
+                else:
+                    start = position + 1
+            file.write(ids[start:])
+            file.flush()
+            os.fsync(file.fileno())
+        replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+    return count
+
+def write_reputation(path: str, ids) -> int:
+    return write_merged(path, memoryview(b'').cast('q'), sorted(set(ids)), ())
+
+def read_id_list(path: str) -> list:
+    ids = []
+    with open(path, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            line = line.split('#', 1)[0].strip()
+            if line.lstrip('-').isdigit():
+                ids.append(int(line))
+    return ids
+
+class Reputation:
+    def __init__(self, path: str = 'reputation.bin', learn: bool = True) -> None:
+        self.path = path
+        self.learn = learn
+        self.ids = memoryview(b'').cast('q')
+        self.stamp = None
+        self.pending = set()
+        self.removed = set()
+        self.lock = threading.Lock()
+        self.running = False
+        self.load()
+
+    def __file_stamp__(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def load(self) -> bool:
+        stamp = self.__file_stamp__()
+        if stamp == self.stamp:
+            return False
+
+        ids = memoryview(b'').cast('q')
+        if stamp is not None and stamp[1] > HEADER.size:
+            with open(self.path, 'rb') as file:
+                mapped = map_file(file)
+
+            magic, count = HEADER.unpack_from(mapped)
+            if magic != MAGIC or HEADER.size + count * 8 != len(mapped):
+                if fcntl is not None:
+                    mapped.close()
+                raise ValueError(f"'{self.path}' is not a reputation file")
+            ids = memoryview(mapped)[HEADER.size:].cast('q')
+
+        self.ids, self.stamp = ids, stamp
+        return True
+
+    def in_file(self, user_id: int) -> bool:
+        ids = self.ids
+        index = bisect_left(ids, user_id)
+        return index < len(ids) and ids[index] == user_id
+
+    def __contains__(self, user_id: int) -> bool:
+        if user_id in self.removed:
+            return False
+        return user_id in self.pending or self.in_file(user_id)
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.pending)
+
+    def add(self, user_id: int) -> None:
+        if self.learn and user_id not in self:
+            with self.lock:
+                self.pending.add(user_id)
+
+    def update(self, user_ids) -> None:
+        user_ids = {int(user_id) for user_id in user_ids}
+        with self.lock:
+            self.removed.difference_update(user_ids)
+            self.pending.update(user_ids)
+
+    def remove(self, user_ids) -> None:
+        user_ids = {int(user_id) for user_id in user_ids}
+        with self.lock:
+            self.pending.difference_update(user_ids)
+            self.removed.update(user_ids)
+
+    def refresh(self) -> int:
+        with self.lock:
+            pending = set(self.pending)
+            removed = set(self.removed)
+
+        with locked(self.path):
+            self.load()
+            missing = sorted(user_id for user_id in pending if not self.in_file(user_id))
+            dropped = [user_id for user_id in removed if self.in_file(user_id)]
+            if missing or dropped:
+                write_merged(self.path, self.ids, missing, dropped)
+                self.load()
+
+        with self.lock:
+            self.pending.difference_update(pending)
+            self.removed.difference_update(removed)
+        return len(missing)
+
+    async def run(self, interval: float = 30.0, on_error = None) -> None:
+        if self.running:
+            return
+
+        self.running = True
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except Exception as E:
+                    if on_error is not None:
+                        on_error(E)
+        finally:
+            self.running = False
@@ -0,0 +1,109 @@
+import re
+import json
+from typing import NamedTuple
+
+COUNTRY_COST = 100
+
+class Rule(NamedTuple):
+    id: int
+    name: str
+    enabled: bool
+    definition: str
+
+class RuleContext:
+    __slots__ = ('sender_id', 'sender', 'text')
+
+    def __init__(self, sender_id: int, sender = None, text: str = '') -> None:
+        self.sender_id = sender_id
+        self.sender = sender
+        self.text = text or ''
+
+def sender_name(sender) -> str:
+    return ' '.join(part for part in (getattr(sender, 'first_name', None), getattr(sender, 'last_name', None)) if part)
+
+def compile_pattern(key: str, value):
+    if not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a regular expression string")
+    try:
+        return re.compile(value, re.IGNORECASE)
+    except re.error as E:
+        raise ValueError(f"Invalid '{key}' pattern: {E}") from E
+
+def compile_condition(key: str, value):
+    if key == 'countries':
+        if value == 'blocked':
+            return COUNTRY_COST, lambda context, country, snapshot: country in snapshot.countries
+        if not isinstance(value, list) or not all(isinstance(code, str) and len(code) == 2 for code in value):
+            raise ValueError("'countries' must be \"blocked\" or a list of two-letter country codes")
+        codes = frozenset(code.upper() for code in value)
+        return COUNTRY_COST, lambda context, country, snapshot: country in codes
+
+    if key == 'min_user_id':
+        threshold = int(value)
+        return 0, lambda context, country, snapshot: context.sender_id >= threshold
+
+    if key == 'premium':
+        expected = bool(value)
+        return 1, lambda context, country, snapshot: context.sender is not None and bool(getattr(context.sender, 'premium', False)) == expected
+
+    if key == 'has_photo':
+        expected = bool(value)
+        return 1, lambda context, country, snapshot: context.sender is not None and context.sender.photo == expected
+
+    if key == 'has_username':
+        expected = bool(value)
+        return 1, lambda context, country, snapshot: context.sender is not None and bool(getattr(context.sender, 'username', None)) == expected
+
+    if key == 'username':
+        pattern = compile_pattern(key, value)
+        return 2, lambda context, country, snapshot: context.sender is not None and pattern.search(getattr(context.sender, 'username', None) or '') is not None
+
+    if key == 'name':
+        pattern = compile_pattern(key, value)
+        return 2, lambda context, country, snapshot: context.sender is not None and pattern.search(sender_name(context.sender)) is not None
+
+    if key == 'text':
+        pattern = compile_pattern(key, value)
+        return 3, lambda context, country, snapshot: pattern.search(context.text) is not None
+
+    raise ValueError(f"Unknown rule condition '{key}'")
+
+class CompiledRule:
+    __slots__ = ('name', 'cheap', 'costly')
+
+    def __init__(self, name: str, definition: dict) -> None:
+        if not isinstance(definition, dict):
+            raise ValueError('A rule must be a JSON object of conditions')
+        if not definition:
+            raise ValueError(f"Rule '{name}' has no conditions")
+
+        conditions = sorted((compile_condition(key, value) for key, value in definition.items()), key = lambda item: item[0])
+        self.name = name
+        self.cheap = tuple(predicate for cost, predicate in conditions if cost < COUNTRY_COST)
+        self.costly = tuple(predicate for cost, predicate in conditions if cost >= COUNTRY_COST)
+
+class RuleSet:
+    def __init__(self, rules: tuple = ()) -> None:
+        self.rules = tuple(
+            CompiledRule(rule.name, json.loads(rule.definition))
+            for rule in rules if rule.enabled
+        )
+
+    def match_cheap(self, context: RuleContext, snapshot):
+        pending = []
+        for rule in self.rules:
+            if all(predicate(context, None, snapshot) for predicate in rule.cheap):
+                if not rule.costly:
+                    return rule.name, pending
+                pending.append(rule)
+
+        return None, pending
+
+    def match_country(self, pending: list, context: RuleContext, country: str, snapshot):
+        for rule in pending:
+            if all(predicate(context, country, snapshot) for predicate in rule.costly):
+                return rule.name
+        return None
+
+def validate_rule(definition: str) -> None:
+    CompiledRule('rule', json.loads(definition))
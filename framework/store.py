@@ -0,0 +1,132 @@
+import time
+import queue
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from framework.metrics import metrics
+
+stores = {}
+stores_lock = threading.Lock()
+
+class Store:
+    def __init__(self, db_path: str = 'settings.db', max_batch: int = 256) -> None:
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.jobs = queue.SimpleQueue()
+        self.conn = None
+
+        ready = Future()
+        self.thread = threading.Thread(target = self.__run__, args = (ready,), name = f'store:{db_path}', daemon = True)
+        self.thread.start()
+        ready.result()
+
+        metrics.gauge('jeetblock_store_queue_depth', self.jobs.qsize, database = db_path)
+
+    def __connect__(self) -> None:
+        self.conn = sqlite3.connect(self.db_path, isolation_level = None, check_same_thread = False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        metrics.track_connection(self.conn, 'store')
+
+    def __run__(self, ready: Future) -> None:
+        try:
+            self.__connect__()
+        except Exception as E:
+            ready.set_exception(E)
+            return
+        ready.set_result(None)
+
+        while True:
+            jobs = [self.jobs.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in jobs
+            self.__execute__([job for job in jobs if job is not None])
+            if stop:
+                self.conn.close()
+                return
+
+    def __execute__(self, jobs: list) -> None:
+        if not jobs:
+            return
+
+        started = time.perf_counter()
+        results = []
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+            for fn, future in jobs:
+                self.conn.execute('SAVEPOINT job')
+                try:
+                    results.append((future, fn(self.conn), None))
+                    self.conn.execute('RELEASE job')
+                except Exception as E:
+                    self.conn.execute('ROLLBACK TO job')
+                    self.conn.execute('RELEASE job')
+                    results.append((future, None, E))
+            self.conn.execute('COMMIT')
+        except Exception as E:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            results = [(future, None, E) for fn, future in jobs]
+
+        metrics.observe('jeetblock_store_commit_seconds', time.perf_counter() - started)
+        metrics.inc('jeetblock_store_jobs_total', len(jobs))
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                metrics.inc('jeetblock_store_errors_total')
+                future.set_exception(error)
+
+    def submit(self, fn) -> Future:
+        future = Future()
+        self.jobs.put((fn, future))
+        return future
+
+    async def run(self, fn):
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def call(self, fn):
+        return self.submit(fn).result()
+
+    def execute(self, statement: str, params: tuple = ()) -> Future:
+        return self.submit(lambda conn: conn.execute(statement, params).rowcount)
+
+    def executemany(self, statement: str, rows: list) -> Future:
+        return self.submit(lambda conn: conn.executemany(statement, rows).rowcount)
+
+    async def fetchall(self, statement: str, params: tuple = ()) -> list:
+        return await self.run(lambda conn: conn.execute(statement, params).fetchall())
+
+    async def fetchone(self, statement: str, params: tuple = ()):
+        return await self.run(lambda conn: conn.execute(statement, params).fetchone())
+
+    def flush(self) -> None:
+        self.call(lambda conn: None)
+
+    def close(self) -> None:
+        with stores_lock:
+            if stores.get(self.db_path) is self:
+                del stores[self.db_path]
+
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+
+def get_store(db_path: str = 'settings.db') -> Store:
+    with stores_lock:
+        store = stores.get(db_path)
+        if store is None:
+            store = stores[db_path] = Store(db_path)
+        return store
+
+metrics.describe('jeetblock_store_commit_seconds', 'Time spent committing one batch of storage jobs.')
+metrics.describe('jeetblock_store_jobs_total', 'Storage jobs executed on the writer thread.')
+metrics.describe('jeetblock_store_errors_total', 'Storage jobs that raised.')
@@ -0,0 +1,111 @@
+import time
+import asyncio
+from datetime import datetime, timezone
+
+from framework.store import get_store
+
+class DialogSweep:
+    def __init__(self, client, detect, on_match, db_path: str = 'settings.db', account: str = '', batch_size: int = 50, pause: float = 1.0) -> None:
+        self.client = client
+        self.account = account
+        self.detect = detect
+        self.on_match = on_match
+        self.batch_size = batch_size
+        self.pause = pause
+
+        self.store = get_store(db_path)
+        self.store.call(self.__init_db__)
+
+    def __init_db__(self, conn) -> None:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(sweep_checkpoint)')]
+        if columns and 'account' not in columns:
+            conn.execute('ALTER TABLE sweep_checkpoint RENAME TO sweep_checkpoint_legacy')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sweep_checkpoint (
+                account TEXT PRIMARY KEY,
+                offset_date REAL,
+                processed INTEGER DEFAULT 0,
+                matched INTEGER DEFAULT 0,
+                finished INTEGER DEFAULT 0,
+                updated_at REAL
+            )
+        ''')
+
+        if columns and 'account' not in columns:
+            conn.execute('''
+                INSERT INTO sweep_checkpoint (account, offset_date, processed, matched, finished, updated_at)
+                SELECT '', offset_date, processed, matched, finished, updated_at FROM sweep_checkpoint_legacy
+            ''')
+            conn.execute('DROP TABLE sweep_checkpoint_legacy')
+
+    async def checkpoint(self) -> dict:
+        row = await self.store.fetchone('SELECT offset_date, processed, matched, finished FROM sweep_checkpoint WHERE account = ?', (self.account,))
+        if row is None:
+            return {'offset_date': None, 'processed': 0, 'matched': 0, 'finished': False}
+
+        return {'offset_date': row[0], 'processed': row[1], 'matched': row[2], 'finished': bool(row[3])}
+
+    def save_checkpoint(self, offset_date: float, processed: int, matched: int, finished: bool) -> None:
+        self.store.execute(
+            'INSERT OR REPLACE INTO sweep_checkpoint (account, offset_date, processed, matched, finished, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (self.account, offset_date, processed, matched, int(finished), time.time())
+        )
+
+    def reset(self) -> None:
+        self.store.execute('DELETE FROM sweep_checkpoint WHERE account = ?', (self.account,))
+
+    async def in_progress(self) -> bool:
+        state = await self.checkpoint()
+        return state['processed'] > 0 and not state['finished']
+
+    async def run(self, progress = None) -> dict:
+        state = await self.checkpoint()
+        if state['finished']:
+            self.reset()
+            state = await self.checkpoint()
+
+        offset_date = state['offset_date']
+        processed, matched = state['processed'], state['matched']
+        batch = []
+
+        async def flush(batch):
+            nonlocal processed, matched
+
+            verdicts = await asyncio.gather(*(self.detect(sender_id, entity, text) for sender_id, entity, text, _ in batch))
+            for (sender_id, _, _, _), verdict in zip(batch, verdicts):
+                if verdict is not None:
+                    matched += 1
+                    await self.on_match(sender_id, verdict)
+
+            processed += len(batch)
+            self.save_checkpoint(batch[-1][3], processed, matched, False)
+            if progress:
+                progress(processed, matched)
+
+            await asyncio.sleep(self.pause)
+
+        async for dialog in self.client.iter_dialogs(
+            offset_date = datetime.fromtimestamp(offset_date, timezone.utc) if offset_date else None,
+            ignore_migrated = True
+        ):
+            entity = dialog.entity
+            if not dialog.is_user or getattr(entity, 'bot', False) or getattr(entity, 'is_self', False):
+                continue
+
+            message = getattr(dialog, 'message', None)
+            batch.append((
+                entity.id,
+                entity,
+                getattr(message, 'message', '') or '',
+                dialog.date.timestamp() if dialog.date else offset_date
+            ))
+            if len(batch) >= self.batch_size:
+                await flush(batch)
+                batch = []
+
+        if batch:
+            await flush(batch)
+
+        self.save_checkpoint(None, processed, matched, True)
+        return {'processed': processed, 'matched': matched}
@@ -1,27 +1,44 @@
-import sys
-from PyQt5.QtCore import Qt
+import time
+import asyncio
+from collections import deque, OrderedDict
+from datetime import datetime
+from PyQt5.QtCore import (
+    Qt, QObject, QTimer, QAbstractTableModel, QAbstractListModel, QModelIndex, QDate, QDateTime, QTime,
+    QEvent, QSize, QRectF, pyqtSignal
+)
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit,
-    QTabWidget, QScrollArea, QGridLayout, QCheckBox, QLineEdit, QPushButton,
-    QSizePolicy
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit,
+    QTabWidget, QGridLayout, QCheckBox, QLineEdit, QPushButton,
+    QSizePolicy, QDialog, QListWidget, QListWidgetItem, QTableView, QComboBox,
+    QDateEdit, QHeaderView, QAbstractItemView, QListView, QStyledItemDelegate, QStyle, QPlainTextEdit
 )
-from PyQt5.QtGui import QTextCursor
+from PyQt5.QtGui import QTextCursor, QTextBlockFormat, QTextCharFormat, QFont, QColor, QPainter
 from framework.database import Settings
-
-settings = Settings()
+from framework.metrics import metrics
+from framework.audit import audit_filter
+from framework.regions import COUNTRIES, PRESETS, apply_preset
+from framework.bus import Record, render_html
+
+SEARCH_RANGES = {
+    'Last Hour': 3600,
+    'Last Day': 86400,
+    'Last Week': 7 * 86400,
+    'All Time': 0
+}
 
 class HomeTab(QWidget):
-    def __init__(self) -> None:
+    def __init__(self, activity = None) -> None:
         super().__init__()
+        self.activity = activity
+        self.search_task = None
 
         self.counters = {
             'Blocked': 0,
             'Deleted': 0
         }
         self.counter_labels = {}
-        self.terminal_lines = []
         self.max_lines = 15000
-        
+
         self.init_ui()
 
     def init_ui(self) -> None:
@@ -29,6 +46,8 @@ class HomeTab(QWidget):
         top_layout = self.create_top_layout()
 
         main_layout.addLayout(top_layout)
+        if self.activity is not None:
+            self.create_search_area(main_layout)
         self.create_terminal_area(main_layout)
 
         self.setLayout(main_layout)
@@ -75,9 +94,80 @@ class HomeTab(QWidget):
 
         self.terminal_text = QTextEdit()
         self.terminal_text.setReadOnly(True)
+        self.terminal_text.setUndoRedoEnabled(False)
+        self.terminal_text.document().setMaximumBlockCount(self.max_lines)
+        self.terminal_cursor = QTextCursor(self.terminal_text.document())
         self.set_terminal_style()
         main_layout.addWidget(self.terminal_text)
 
+    def create_search_area(self, main_layout: QVBoxLayout) -> None:
+        search_layout = QHBoxLayout()
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Search Activity Log')
+        self.search_input.returnPressed.connect(self.start_search)
+        search_layout.addWidget(self.search_input)
+
+        self.search_range = QComboBox()
+        self.search_range.addItems(list(SEARCH_RANGES))
+        search_layout.addWidget(self.search_range)
+
+        for text, handler in (('SEARCH', self.start_search), ('CLEAR', self.clear_search)):
+            btn = QPushButton(text)
+            btn.clicked.connect(handler)
+            search_layout.addWidget(btn)
+        main_layout.addLayout(search_layout)
+
+        self.search_results = QPlainTextEdit()
+        self.search_results.setReadOnly(True)
+        self.search_results.setMaximumBlockCount(1000)
+        self.search_results.setStyleSheet('''
+            font-family: 'Courier New', monospace;
+            font-size: 10pt;
+            background-color: #252526;
+            color: #D4D4D4;
+            border: none;
+        ''')
+        self.search_results.hide()
+        main_layout.addWidget(self.search_results)
+
+    def start_search(self) -> None:
+        if self.search_task is not None:
+            self.search_task.cancel()
+
+        self.search_results.clear()
+        self.search_results.show()
+        self.search_task = asyncio.ensure_future(self.run_search(
+            self.search_input.text().strip(),
+            SEARCH_RANGES[self.search_range.currentText()]
+        ))
+
+    async def run_search(self, text: str, window: float) -> None:
+        flushed = self.activity.flush()
+        if flushed is not None:
+            await asyncio.wrap_future(flushed)
+
+        found = 0
+        since = time.time() - window if window else None
+        async for batch in self.activity.stream(text, since = since):
+            self.search_results.appendPlainText('\n'.join(
+                f'{datetime.fromtimestamp(line["ts"]):%Y-%m-%d %H:%M:%S} {line["account"] + " " if line["account"] else ""}{line["text"]}'
+                for line in batch
+            ))
+            found += len(batch)
+
+        if not found:
+            self.search_results.appendPlainText('No Matches')
+
+    def clear_search(self) -> None:
+        if self.search_task is not None:
+            self.search_task.cancel()
+            self.search_task = None
+
+        self.search_input.clear()
+        self.search_results.clear()
+        self.search_results.hide()
+
     def set_terminal_style(self) -> None:
         self.terminal_text.setStyleSheet('''
             font-family: 'Courier New', monospace;
@@ -90,32 +180,508 @@ class HomeTab(QWidget):
         self.terminal_text.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.terminal_text.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
-    def increment_counter(self, key: str) -> None:
+    def increment_counter(self, key: str, amount: int = 1) -> None:
         if key in self.counters:
-            self.counters[key] += 1
+            self.counters[key] += amount
             self.counter_labels[key].setText(str(self.counters[key]))
 
     def add_to_terminal(self, text: str) -> None:
-        if text:
-            self.terminal_lines.append(text)
-            if len(self.terminal_lines) > self.max_lines:
-                self.terminal_lines = self.terminal_lines[-self.max_lines:]
+        self.extend_terminal([text])
+
+    def extend_terminal(self, lines: list) -> None:
+        lines = [text for text in lines if text]
+        if not lines:
+            return
+
+        self.terminal_cursor.beginEditBlock()
+        for text in lines:
+            self.terminal_cursor.movePosition(QTextCursor.End)
+            if not self.terminal_text.document().isEmpty():
+                self.terminal_cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+            self.terminal_cursor.insertHtml(text)
+        self.terminal_cursor.endEditBlock()
+
+        self.terminal_text.moveCursor(QTextCursor.End)
+
+class UpdateChannel(QObject):
+    def __init__(self, main_window, rate: int = 30, max_queued: int = 2000) -> None:
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.lines = deque(maxlen = max_queued)
+        self.deltas = {}
+        self.dropped = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000 // rate)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def queue_line(self, text) -> None:
+        if len(self.lines) == self.lines.maxlen:
+            self.dropped += 1
+        self.lines.append(text)
+
+    def queue_record(self, record: Record) -> None:
+        self.queue_line(record)
+
+    def queue_increment(self, key: str, amount: int = 1) -> None:
+        self.deltas[key] = self.deltas.get(key, 0) + amount
+
+    def flush(self) -> None:
+        if not self.lines and not self.deltas and not self.dropped:
+            return
+
+        lines = [render_html(line) if isinstance(line, Record) else line for line in self.lines]
+        self.lines.clear()
+        if self.dropped:
+            lines.insert(0, f'[<span style="color: yellow;">OUTPUT</span>] ... {self.dropped} Lines Dropped ...')
+            self.dropped = 0
+
+        deltas, self.deltas = self.deltas, {}
+
+        self.main_window.setUpdatesEnabled(False)
+        try:
+            with metrics.timer('render'):
+                self.main_window.home_tab.extend_terminal(lines)
+                for key, amount in deltas.items():
+                    self.main_window.home_tab.increment_counter(key, amount)
+        finally:
+            self.main_window.setUpdatesEnabled(True)
+
+SPARKS = '▁▂▃▄▅▆▇█'
+
+def sparkline(values: list) -> str:
+    peak = max(values) if values else 0
+    if not peak:
+        return SPARKS[0] * len(values)
+    return ''.join(SPARKS[0] if not value else SPARKS[max(1, value * (len(SPARKS) - 1) // peak)] for value in values)
+
+class StatsTab(QWidget):
+    def __init__(self, counters = None) -> None:
+        super().__init__()
+        self.counters = counters
+        self.series_lines = []
+        self.series_loaded = 0.0
+        self.init_ui()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+
+    def init_ui(self) -> None:
+        layout = QVBoxLayout()
+
+        self.stats_text = QTextEdit()
+        self.stats_text.setReadOnly(True)
+        self.stats_text.setStyleSheet('''
+            font-family: 'Courier New', monospace;
+            font-size: 11pt;
+            background-color: #1E1E1E;
+            color: #D4D4D4;
+            border: none;
+        ''')
+        layout.addWidget(self.stats_text)
+
+        self.setLayout(layout)
+
+    async def load_series(self) -> None:
+        lines = [f'{"last 48h":<12}{"hourly":<48}{"total":>8}']
+        for name in ('Detected', 'Blocked', 'Deleted'):
+            values = await self.counters.series(name, 48)
+            lines.append(f'{name:<12}{sparkline(values)}{sum(values):>8}')
+
+        top = await self.counters.by_country('Detected', 24)
+        lines.append('top countries (24h): ' + (', '.join(f'{country} {value}' for country, value in top) or '-'))
+        self.series_lines = lines
+
+    def refresh(self) -> None:
+        if not self.isVisible():
+            return
+
+        if self.counters is not None and time.monotonic() - self.series_loaded > 30:
+            self.series_loaded = time.monotonic()
+            asyncio.ensure_future(self.load_series())
+
+        lines = [f'{"stage":<12}{"count":>8}{"avg ms":>10}{"p50 ms":>10}{"p99 ms":>10}']
+        rows = sorted(
+            (dict(labels).get('stage') or dict(labels).get('method'), name, histogram)
+            for (name, labels), histogram in metrics.histograms.items()
+            if name in ('jeetblock_stage_seconds', 'jeetblock_rpc_seconds')
+        )
+        for label, name, histogram in rows:
+            avg = histogram.sum / histogram.count * 1000 if histogram.count else 0.0
+            lines.append(
+                f'{label[:11]:<12}{histogram.count:>8}{avg:>10.2f}{histogram.quantile(0.5) * 1000:>10.1f}{histogram.quantile(0.99) * 1000:>10.1f}'
+            )
+
+        lines.append('')
+        for (name, labels), value in sorted(metrics.counters.items()):
+            suffix = ','.join(str(value) for _, value in labels)
+            lines.append(f'{name.replace("jeetblock_", "")}{"[" + suffix + "]" if suffix else ""}: {value}')
+        for (name, labels), callback in sorted(metrics.gauges.items(), key = lambda item: item[0]):
+            suffix = ','.join(str(value) for _, value in labels)
+            lines.append(f'{name.replace("jeetblock_", "")}{"[" + suffix + "]" if suffix else ""}: {callback()}')
+
+        lines.append(f'loop_lag_ms: {metrics.loop_lag * 1000:.1f}')
+        if self.series_lines:
+            lines = self.series_lines + [''] + lines
+        self.stats_text.setPlainText('\n'.join(lines))
+
+class HistoryModel(QAbstractTableModel):
+    HEADERS = ('Time', 'Sender', 'Username', 'Country', 'Action', 'Rule', 'Latency ms', 'Error')
+    counted = pyqtSignal(int)
+
+    def __init__(self, store, page_size: int = 200, max_pages: int = 16) -> None:
+        super().__init__()
+        self.store = store
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.loading = set()
+        self.generation = 0
+        self.where, self.params = audit_filter()
+        self.total = 0
+        self.reload()
+
+    def set_filter(self, **filters) -> None:
+        self.where, self.params = audit_filter(**filters)
+        self.reload()
+
+    def reload(self) -> None:
+        self.beginResetModel()
+        self.pages.clear()
+        self.loading.clear()
+        self.total = 0
+        self.generation += 1
+        self.endResetModel()
+
+        asyncio.ensure_future(self.count(self.generation))
+
+    async def count(self, generation: int) -> None:
+        total = (await self.store.fetchone(f'SELECT COUNT(*) FROM audit_log{self.where}', self.params))[0]
+        if generation != self.generation:
+            return
+
+        self.beginResetModel()
+        self.total = total
+        self.endResetModel()
+        self.counted.emit(total)
+
+    def page(self, number: int) -> list:
+        rows = self.pages.get(number)
+        if rows is not None:
+            self.pages.move_to_end(number)
+            return rows
+
+        if number not in self.loading:
+            self.loading.add(number)
+            asyncio.ensure_future(self.load_page(number, self.generation))
+        return None
+
+    async def load_page(self, number: int, generation: int) -> None:
+        previous = self.pages.get(number - 1)
+        columns = 'id, ts, sender_id, username, country, action, rule, latency, error'
+        if previous:
+            last = previous[-1]
+            where = f'{self.where} AND (ts, id) < (?, ?)' if self.where else ' WHERE (ts, id) < (?, ?)'
+            rows = await self.store.fetchall(
+                f'SELECT {columns} FROM audit_log{where} ORDER BY ts DESC, id DESC LIMIT ?',
+                self.params + (last[1], last[0], self.page_size)
+            )
+        else:
+            rows = await self.store.fetchall(
+                f'SELECT {columns} FROM audit_log{self.where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?',
+                self.params + (self.page_size, number * self.page_size)
+            )
+
+        if generation != self.generation:
+            return
+
+        self.loading.discard(number)
+        self.pages[number] = rows
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last = False)
+
+        first = number * self.page_size
+        last_row = min(first + self.page_size, self.total) - 1
+        if last_row >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last_row, len(self.HEADERS) - 1))
+
+    def rowCount(self, parent = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.total
+
+    def columnCount(self, parent = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role = Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+
+        number, offset = divmod(index.row(), self.page_size)
+        rows = self.page(number)
+        if rows is None or offset >= len(rows):
+            return None
+
+        row_id, ts, sender_id, username, country, action, rule, latency, error = rows[offset]
+        return (
+            datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'),
+            str(sender_id),
+            f'@{username}' if username else '',
+            country or '',
+            action,
+            rule or '',
+            '' if latency is None else f'{latency * 1000:.1f}',
+            error or ''
+        )[index.column()]
+
+class HistoryTab(QWidget):
+    def __init__(self, main_window) -> None:
+        super().__init__()
+        self.model = HistoryModel(main_window.settings.store)
+        self.model.counted.connect(self.update_status)
+        self.init_ui()
+
+    def init_ui(self) -> None:
+        layout = QVBoxLayout()
+        filters = QHBoxLayout()
+
+        self.country_input = QLineEdit()
+        self.country_input.setPlaceholderText('Country')
+        self.country_input.setMaxLength(2)
+        self.country_input.setFixedWidth(80)
+        self.country_input.returnPressed.connect(self.apply_filter)
+        filters.addWidget(self.country_input)
+
+        self.action_input = QComboBox()
+        self.action_input.addItems(['All Actions', 'detect', 'block', 'delete'])
+        self.action_input.currentIndexChanged.connect(self.apply_filter)
+        filters.addWidget(self.action_input)
+
+        self.date_check = QCheckBox('From')
+        self.date_check.toggled.connect(self.apply_filter)
+        filters.addWidget(self.date_check)
+
+        self.since_input = QDateEdit(QDate.currentDate().addDays(-7))
+        self.until_input = QDateEdit(QDate.currentDate())
+        for field in (self.since_input, self.until_input):
+            field.setCalendarPopup(True)
+            field.dateChanged.connect(self.apply_filter)
+        filters.addWidget(self.since_input)
+        filters.addWidget(QLabel('To'))
+        filters.addWidget(self.until_input)
+
+        refresh_btn = QPushButton('REFRESH')
+        refresh_btn.clicked.connect(self.apply_filter)
+        filters.addWidget(refresh_btn)
+        filters.addStretch()
+        layout.addLayout(filters)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(20)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setStyleSheet('font-size: 10pt; font-family: "Cascadia Code", "Courier New", monospace;')
+        layout.addWidget(self.table)
+
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet('font-size: 9pt; font-family: "Cascadia Code", "Courier New", monospace;')
+        layout.addWidget(self.status_label)
+
+        self.setLayout(layout)
+        self.update_status()
+
+    def apply_filter(self, *args) -> None:
+        since = until = None
+        if self.date_check.isChecked():
+            since = QDateTime(self.since_input.date(), QTime(0, 0)).toSecsSinceEpoch()
+            until = QDateTime(self.until_input.date().addDays(1), QTime(0, 0)).toSecsSinceEpoch()
+
+        self.model.set_filter(
+            country = self.country_input.text().strip().upper() or None,
+            action = self.action_input.currentText() if self.action_input.currentIndex() else None,
+            since = since,
+            until = until
+        )
+
+    def update_status(self, total: int = 0) -> None:
+        self.status_label.setText(f'{total} Entries')
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.apply_filter()
+
+ACTION_BUTTON_STYLE = '''
+    QPushButton {
+        font-size: 12pt;
+        font-family: 'Cascadia Code', 'Courier New', monospace;
+        background-color: #DDDDDD;
+        color: black;
+        border: 1px solid #AAAAAA;
+        border-radius: 6px;
+        padding: 8px 12px;
+    }
+    QPushButton:hover {
+        background-color: #CFCFCF;
+    }
+    QPushButton:pressed {
+        background-color: #BBBBBB;
+    }
+'''
+
+CHECKBOX_STYLE = '''
+    QCheckBox {
+        font-size: 13pt;
+        font-family: 'Cascadia Code', 'Courier New', monospace;
+        spacing: 10px;
+        margin-bottom: 6px;
+    }
+
+    QCheckBox::indicator {
+        width: 14px;
+        height: 14px;
+        border: 2px solid #888;
+        border-radius: 4px;
+        background-color: transparent;
+    }
+
+    QCheckBox::indicator:checked {
+        background-color: #BBBBBB;
+        border: 2px solid #BBBBBB;
+    }
+
+    QCheckBox::indicator:hover {
+        border: 2px solid #CFCFCF;
+    }
+'''
+
+class CountryModel(QAbstractListModel):
+    toggled = pyqtSignal(str, bool)
+
+    def __init__(self, codes: list, blocked = ()) -> None:
+        super().__init__()
+        self.codes = list(codes)
+        self.blocked = set(blocked)
+
+    def rowCount(self, parent = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.codes)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        code = self.codes[index.row()]
+        if role == Qt.DisplayRole:
+            return code
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if code in self.blocked else Qt.Unchecked
+        return None
+
+    def setData(self, index, value, role = Qt.CheckStateRole) -> bool:
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+
+        code = self.codes[index.row()]
+        checked = value == Qt.Checked
+        if checked == (code in self.blocked):
+            return False
+
+        if checked:
+            self.blocked.add(code)
+        else:
+            self.blocked.discard(code)
+
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        self.toggled.emit(code, checked)
+        return True
+
+    def set_blocked(self, codes) -> None:
+        self.blocked = set(codes)
+        if self.codes:
+            self.dataChanged.emit(self.index(0), self.index(len(self.codes) - 1), [Qt.CheckStateRole])
+
+class CountryDelegate(QStyledItemDelegate):
+    def __init__(self, parent = None) -> None:
+        super().__init__(parent)
+        self.font = QFont()
+        self.font.setPointSize(11)
+        self.font.setBold(True)
+        self.border = QColor('#AAAAAA')
+        self.colors = {
+            (False, False): (QColor('#F1F1F1'), QColor('black')),
+            (False, True): (QColor('#E0E0E0'), QColor('black')),
+            (True, False): (QColor('#4A90E2'), QColor('white')),
+            (True, True): (QColor('#4A90E2'), QColor('white'))
+        }
 
-            self.terminal_text.setHtml('<br>'.join(self.terminal_lines))
-            self.terminal_text.moveCursor(QTextCursor.End)
+    def paint(self, painter, option, index) -> None:
+        checked = index.data(Qt.CheckStateRole) == Qt.Checked
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        background, foreground = self.colors[(checked, hovered)]
+        rect = option.rect.adjusted(3, 3, -3, -3)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self.border)
+        painter.setBrush(background)
+        painter.drawRoundedRect(QRectF(rect), 6, 6)
+        painter.setPen(foreground)
+        painter.setFont(self.font)
+        painter.drawText(rect, Qt.AlignCenter, index.data(Qt.DisplayRole))
+        painter.restore()
+
+    def sizeHint(self, option, index) -> QSize:
+        return QSize(56, 46)
+
+    def editorEvent(self, event, model, option, index) -> bool:
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and option.rect.contains(event.pos()):
+            checked = index.data(Qt.CheckStateRole) == Qt.Checked
+            return model.setData(index, Qt.Unchecked if checked else Qt.Checked, Qt.CheckStateRole)
+        return False
+
+class CountryGrid(QListView):
+    def __init__(self, model: CountryModel) -> None:
+        super().__init__()
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setGridSize(QSize(56, 46))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setMouseTracking(True)
+        self.setItemDelegate(CountryDelegate(self))
+        self.setModel(model)
 
 class SettingsTab(QWidget):
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
-        self.country_buttons = {}
+        self.settings = main_window.settings
         self.checkboxes = {}
-        self.init_ui()
+        with metrics.timer('settings_ui'):
+            self.init_ui()
 
     def init_ui(self):
         layout = QHBoxLayout()
 
+        snapshot = self.settings.snapshot
+
         left_panel = QWidget()
+        left_panel.setStyleSheet(ACTION_BUTTON_STYLE)
         left_layout = QVBoxLayout(left_panel)
 
         block_button = QPushButton('BLOCK NON-US')
@@ -123,159 +689,51 @@ class SettingsTab(QWidget):
 
         block_button_undo = QPushButton('UNBLOCK ALL')
         block_button_undo.clicked.connect(self.handle_country_unblock_toggle)
-        for btn in (block_button, block_button_undo):
-            btn.setStyleSheet('''
-                QPushButton {
-                    font-size: 12pt;
-                    font-family: 'Cascadia Code', 'Courier New', monospace;
-                    background-color: #DDDDDD;
-                    color: black;
-                    border: 1px solid #AAAAAA;
-                    border-radius: 6px;
-                    padding: 8px 12px;
-                }
-                QPushButton:hover {
-                    background-color: #CFCFCF;
-                }
-                QPushButton:pressed {
-                    background-color: #BBBBBB;
-                }
-            ''')
 
+        rules_button = QPushButton('EDIT RULES')
+        rules_button.clicked.connect(self.open_rules)
+
+        allowlist_button = QPushButton('ALLOWLIST')
+        allowlist_button.clicked.connect(self.open_allowlist)
+        for btn in (block_button, block_button_undo, rules_button, allowlist_button):
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
             left_layout.addWidget(btn)
 
+        preset_layout = QHBoxLayout()
+        self.preset_input = QComboBox()
+        self.preset_input.addItems(list(PRESETS))
+        self.preset_input.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        preset_button = QPushButton('APPLY')
+        preset_button.clicked.connect(self.handle_preset)
+        preset_layout.addWidget(self.preset_input)
+        preset_layout.addWidget(preset_button)
+        left_layout.addLayout(preset_layout)
+
         country_label = QLabel('Countries:')
         country_label.setStyleSheet('margin-top: 8px; font-size: 11pt; font-family: "Cascadia Code", "Courier New", monospace;')
         left_layout.addWidget(country_label)
 
-        country_scroll = QScrollArea()
-        country_scroll.setWidgetResizable(True)
-        country_widget = QWidget()
-        country_layout = QGridLayout(country_widget)
-        country_scroll.setWidget(country_widget)
-        left_layout.addWidget(country_scroll)
-
-        countries = [
-            'AF', 'AL', 'DZ', 'AD', 'AO', 
-            'AG', 'AR', 'AM', 'AU', 'AT',
-            'AZ', 'BS', 'BH', 'BD', 'BB', 
-            'BY', 'BE', 'BZ', 'BJ', 'BT',
-            'BO', 'BA', 'BW', 'BR', 'BN', 
-            'BG', 'BF', 'BI', 'CV', 'KH',
-            'CM', 'CA', 'CF', 'TD', 'CL', 
-            'CN', 'CO', 'KM', 'CD', 'CG',
-            'CR', 'CI', 'HR', 'CU', 'CY', 
-            'CZ', 'DK', 'DJ', 'DM', 'DO',
-            'EC', 'EG', 'SV', 'GQ', 'ER', 
-            'EE', 'SZ', 'ET', 'FJ', 'FI',
-            'FR', 'GA', 'GM', 'GE', 'DE', 
-            'GH', 'GR', 'GD', 'GT', 'GN',
-            'GW', 'GY', 'HT', 'HN', 'HU', 
-            'IS', 'IN', 'ID', 'IR', 'IQ',
-            'IE', 'IL', 'IT', 'JM', 'JP', 
-            'JO', 'KZ', 'KE', 'KI', 'KP',
-            'KR', 'KW', 'KG', 'LA', 'LV', 
-            'LB', 'LS', 'LR', 'LY', 'LI',
-            'LT', 'LU', 'MG', 'MW', 'MY', 
-            'MV', 'ML', 'MT', 'MH', 'MR',
-            'MU', 'MX', 'FM', 'MD', 'MC', 
-            'MN', 'ME', 'MA', 'MZ', 'MM',
-            'NA', 'NR', 'NP', 'NL', 'NZ', 
-            'NI', 'NE', 'NG', 'MK', 'NO',
-            'OM', 'PK', 'PW', 'PA', 'PG', 
-            'PY', 'PE', 'PH', 'PL', 'PT',
-            'QA', 'RO', 'RU', 'RW', 'KN', 
-            'LC', 'VC', 'WS', 'SM', 'ST',
-            'SA', 'SN', 'RS', 'SC', 'SL', 
-            'SG', 'SK', 'SI', 'SB', 'SO',
-            'ZA', 'SS', 'ES', 'LK', 'SD', 
-            'SR', 'SE', 'CH', 'SY', 'TW',
-            'TJ', 'TZ', 'TH', 'TL', 'TG', 
-            'TO', 'TT', 'TN', 'TR', 'TM',
-            'TV', 'UG', 'UA', 'AE', 'GB', 
-            'US', 'UY', 'UZ', 'VU', 'VA',
-            'VE', 'VN', 'YE', 'ZM', 'ZW',
-            'PS', 'PR', 'RE', 'YT', 'SH', 'EH'
-        ]
-        
-        for i, code in enumerate(countries):
-            btn = QPushButton(code)
-            btn.setCheckable(True)
-            btn.setFixedSize(50, 40)
-            btn.setStyleSheet('''
-                QPushButton {
-                    font-size: 11pt;
-                    font-weight: bold;
-                    background-color: #F1F1F1;
-                    color: black;
-                    border: 1px solid #AAAAAA;
-                    border-radius: 6px;
-                }
-                              
-                QPushButton:hover {
-                    background-color: #E0E0E0;
-                }
-                              
-                QPushButton:pressed {
-                    background-color: #CCCCCC;
-                }
-                              
-                QPushButton:checked {
-                    background-color: #4A90E2;
-                    color: white;
-                }
-            ''')
-
-            self.country_buttons[code] = btn
-
-            btn.setChecked(code in settings.get_countries())
-            btn.toggled.connect(lambda checked, c = code: self.toggle_country(c, checked)) 
-
-            country_layout.addWidget(btn, i // 5, i % 5)
+        self.country_model = CountryModel(COUNTRIES, snapshot.countries)
+        self.country_model.toggled.connect(self.toggle_country)
+        self.country_grid = CountryGrid(self.country_model)
+        left_layout.addWidget(self.country_grid)
 
         right_panel = QWidget()
+        right_panel.setStyleSheet(CHECKBOX_STYLE)
         right_layout = QVBoxLayout(right_panel)
         right_layout.setContentsMargins(10, 10, 10, 10)
 
-        for label in ['Delete Chat', 'Block User', 'Log User Info', 'Log Successful Block', 'Log Successful Delete', 'Log Errors']:
+        for label, initial in (
+            ('Delete Chat', snapshot.delete_chat),
+            ('Block User', snapshot.block_user),
+            ('Log User Info', snapshot.log_user_info),
+            ('Log Successful Block', snapshot.log_block),
+            ('Log Successful Delete', snapshot.log_delete),
+            ('Log Errors', snapshot.log_errors)
+        ):
             box = QCheckBox(label)
-            box.setStyleSheet('''
-                QCheckBox {
-                    font-size: 13pt;
-                    font-family: 'Cascadia Code', 'Courier New', monospace;
-                    spacing: 10px;
-                    margin-bottom: 6px;
-                }
-
-                QCheckBox::indicator {
-                    width: 14px;
-                    height: 14px;
-                    border: 2px solid #888;
-                    border-radius: 4px;
-                    background-color: transparent;
-                }
-
-                QCheckBox::indicator:checked {
-                    background-color: #BBBBBB;
-                    border: 2px solid #BBBBBB;
-                }
-
-                QCheckBox::indicator:hover {
-                    border: 2px solid #CFCFCF;
-                }
-            ''')
+            box.setChecked(initial)
             self.checkboxes[label] = box
-            initial = {
-                'Delete Chat': settings.get_delete_chat,
-                'Block User': settings.get_block_user,
-                'Log User Info': settings.get_log_user_info,
-                'Log Successful Block': settings.get_log_block,
-                'Log Successful Delete': settings.get_log_delete,
-                'Log Errors': settings.get_log_errors
-            }[label]
-
-            box.setChecked(initial())
 
             box.stateChanged.connect(lambda state, l=label: self.handle_settings_toggle(l, state))
             right_layout.addWidget(box)
@@ -335,45 +793,61 @@ class SettingsTab(QWidget):
 
     def toggle_country(self, code, checked):
         if not checked:
-            settings.remove_countries([code])
+            self.settings.remove_countries([code])
             self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">REGION</span>] Removed '{code}' from Blocked Countries """)
             return
         
         self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">REGION</span>] Added '{code}' to Blocked Countries""")
-        settings.add_countries([code])
+        self.settings.add_countries([code])
 
     def handle_country_toggle(self):
-        disabled = []
-
-        for code, button in self.country_buttons.items():
-            if code == 'US':
-                button.setChecked(False)
-                continue
-
-            button.setChecked(True)
-            disabled.append(code)
-
-        self.main_window.log_to_terminal(f'[<span style="color: lightblue;">REGION</span>] Blocked {len(self.country_buttons.items())} Countries (Excluding: US)')
-        settings.add_countries(disabled)
+        self.apply_countries(apply_preset(self.settings.get_countries(), 'Allow Only US'), 'Block Non-US')
 
     def handle_country_unblock_toggle(self):
-        enabled = []
-
-        for code, button in self.country_buttons.items():
-            button.setChecked(False)
-            enabled.append(code)
-        
-        self.main_window.log_to_terminal(f'[<span style="color: lightblue;">REGION</span>] Unblocked {len(self.country_buttons.items())} Countries')
-        settings.remove_countries(enabled)
+        self.apply_countries((), 'Unblock All')
+
+    def handle_preset(self):
+        name = self.preset_input.currentText()
+        self.apply_countries(apply_preset(self.settings.get_countries(), name), name)
+
+    def apply_countries(self, countries, label: str):
+        added, removed = self.settings.set_countries(countries)
+        self.country_model.set_blocked(self.settings.get_countries())
+
+        self.main_window.log_to_terminal(
+            f'[<span style="color: lightblue;">REGION</span>] {label}: Blocked {len(added)}, Unblocked {len(removed)} ({len(self.settings.get_countries())} Blocked Countries)'
+        )
+
+    def open_rules(self):
+        RulesDialog(self.main_window).exec_()
+
+    def open_allowlist(self):
+        AllowlistDialog(self.main_window).exec_()
+
+    def sync(self, snapshot) -> None:
+        for label, value in (
+            ('Delete Chat', snapshot.delete_chat),
+            ('Block User', snapshot.block_user),
+            ('Log User Info', snapshot.log_user_info),
+            ('Log Successful Block', snapshot.log_block),
+            ('Log Successful Delete', snapshot.log_delete),
+            ('Log Errors', snapshot.log_errors)
+        ):
+            box = self.checkboxes[label]
+            box.blockSignals(True)
+            box.setChecked(value)
+            box.blockSignals(False)
+
+        self.country_model.set_blocked(snapshot.countries)
 
     def handle_settings_toggle(self, label, state):
         labels = {
-            'Delete Chat': settings.configure_delete_chat,
-            'Block User': settings.configure_block_user,
-            'Log User Info': settings.configure_log_user_info,
-            'Log Successful Block': settings.configure_log_block,
-            'Log Successful Delete': settings.configure_log_delete,
-            'Log Errors': settings.configure_log_errors
+            'Delete Chat': self.settings.configure_delete_chat,
+            'Block User': self.settings.configure_block_user,
+            'Log User Info': self.settings.configure_log_user_info,
+            'Log Successful Block': self.settings.configure_log_block,
+            'Log Successful Delete': self.settings.configure_log_delete,
+            'Log Errors': self.settings.configure_log_errors
         }
 
         for _label, function in labels.items():
@@ -381,30 +855,225 @@ class SettingsTab(QWidget):
                 function(state)
                 self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">CONFIG</span>] {'Enabled' if state else 'Disabled'} '{label}' """)
 
+class RulesDialog(QDialog):
+    def __init__(self, main_window):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.settings = main_window.settings
+        self.setWindowTitle('Rules')
+        self.setFixedSize(560, 420)
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        hint = QLabel('One JSON object per rule, all conditions must match. Keys: countries ("blocked" or list), premium, has_photo, has_username, username, name, text (regex), min_user_id.')
+        hint.setWordWrap(True)
+        hint.setStyleSheet('font-size: 9pt; font-family: "Cascadia Code", "Courier New", monospace;')
+        layout.addWidget(hint)
+
+        self.rule_list = QListWidget()
+        self.rule_list.currentItemChanged.connect(self.select_rule)
+        self.rule_list.itemChanged.connect(self.toggle_rule)
+        layout.addWidget(self.rule_list)
+
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText('Name')
+        self.definition_input = QLineEdit()
+        self.definition_input.setPlaceholderText('{"countries": "blocked", "has_photo": false}')
+        for field in (self.name_input, self.definition_input):
+            field.setStyleSheet('font-size: 11pt; font-family: "Cascadia Code", "Courier New", monospace; padding: 4px;')
+            layout.addWidget(field)
+
+        self.error_label = QLabel('')
+        self.error_label.setStyleSheet('color: #C0392B; font-size: 10pt;')
+        layout.addWidget(self.error_label)
+
+        buttons = QHBoxLayout()
+        for text, handler in (('NEW', self.new_rule), ('SAVE', self.save_rule), ('DELETE', self.delete_rule)):
+            btn = QPushButton(text)
+            btn.clicked.connect(handler)
+            buttons.addWidget(btn)
+        layout.addLayout(buttons)
+
+        self.setLayout(layout)
+
+    def refresh(self):
+        self.rule_list.blockSignals(True)
+        self.rule_list.clear()
+        for rule in self.settings.get_rules():
+            item = QListWidgetItem(rule.name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if rule.enabled else Qt.Unchecked)
+            item.setData(Qt.UserRole, rule.id)
+            self.rule_list.addItem(item)
+        self.rule_list.blockSignals(False)
+
+    def current_rule(self):
+        item = self.rule_list.currentItem()
+        if item is None:
+            return None
+
+        rule_id = item.data(Qt.UserRole)
+        return next((rule for rule in self.settings.get_rules() if rule.id == rule_id), None)
+
+    def select_rule(self, item, previous = None):
+        rule = self.current_rule()
+        self.name_input.setText(rule.name if rule else '')
+        self.definition_input.setText(rule.definition if rule else '')
+        self.error_label.setText('')
+
+    def new_rule(self):
+        self.rule_list.setCurrentItem(None)
+        self.name_input.clear()
+        self.definition_input.clear()
+        self.name_input.setFocus()
+
+    def save_rule(self):
+        rule = self.current_rule()
+        name = self.name_input.text().strip() or 'Rule'
+
+        try:
+            self.settings.save_rule(name, self.definition_input.text().strip(), rule.enabled if rule else True, rule.id if rule else None)
+        except (ValueError, TypeError) as E:
+            self.error_label.setText(str(E))
+            return
+
+        self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">CONFIG</span>] Saved Rule '{name}'""")
+        self.refresh()
+
+    def delete_rule(self):
+        rule = self.current_rule()
+        if rule is None:
+            return
+
+        self.settings.delete_rule(rule.id)
+        self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">CONFIG</span>] Deleted Rule '{rule.name}'""")
+        self.new_rule()
+        self.refresh()
+
+    def toggle_rule(self, item):
+        rule_id = item.data(Qt.UserRole)
+        rule = next((rule for rule in self.settings.get_rules() if rule.id == rule_id), None)
+        if rule is None:
+            return
+
+        enabled = item.checkState() == Qt.Checked
+        self.settings.save_rule(rule.name, rule.definition, enabled, rule.id)
+        self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">CONFIG</span>] {'Enabled' if enabled else 'Disabled'} Rule '{rule.name}'""")
+
+class AllowlistDialog(QDialog):
+    def __init__(self, main_window):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.settings = main_window.settings
+        self.setWindowTitle('Allowlist')
+        self.setFixedSize(360, 420)
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        hint = QLabel('Contacts and chats you have written to are allowed automatically. Add extra user IDs here.')
+        hint.setWordWrap(True)
+        hint.setStyleSheet('font-size: 9pt; font-family: "Cascadia Code", "Courier New", monospace;')
+        layout.addWidget(hint)
+
+        self.id_list = QListWidget()
+        layout.addWidget(self.id_list)
+
+        self.id_input = QLineEdit()
+        self.id_input.setPlaceholderText('User IDs, comma separated')
+        self.id_input.setStyleSheet('font-size: 11pt; font-family: "Cascadia Code", "Courier New", monospace; padding: 4px;')
+        self.id_input.returnPressed.connect(self.add_ids)
+        layout.addWidget(self.id_input)
+
+        buttons = QHBoxLayout()
+        for text, handler in (('ADD', self.add_ids), ('REMOVE', self.remove_selected)):
+            btn = QPushButton(text)
+            btn.clicked.connect(handler)
+            buttons.addWidget(btn)
+        layout.addLayout(buttons)
+
+        self.setLayout(layout)
+
+    def refresh(self):
+        self.id_list.clear()
+        self.id_list.addItems([str(user_id) for user_id in sorted(self.settings.get_allowed())])
+
+    def add_ids(self):
+        user_ids = [part.strip() for part in self.id_input.text().split(',') if part.strip().lstrip('-').isdigit()]
+        if not user_ids:
+            return
+
+        self.settings.allow_users(user_ids)
+        self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">ALLOW</span>] Allowlisted {len(user_ids)} Users""")
+        self.id_input.clear()
+        self.refresh()
+
+    def remove_selected(self):
+        user_ids = [item.text() for item in self.id_list.selectedItems()]
+        if not user_ids:
+            return
+
+        self.settings.disallow_users(user_ids)
+        self.main_window.log_to_terminal(f"""[<span style="color: lightblue;">ALLOW</span>] Removed {len(user_ids)} Users from Allowlist""")
+        self.refresh()
+
 class MainWindow(QWidget):
-    def __init__(self):
+    def __init__(self, settings: Settings, startup_budget: float = 0.15, activity = None, counters = None):
         super().__init__()
+        self.settings = settings
+        self.activity = activity
+        self.counters = counters
         self.setWindowTitle('JB')
         self.setFixedSize(800, 600)
-        self.init_ui()
+
+        started = time.perf_counter()
+        with metrics.timer('window_ui'):
+            self.init_ui()
+        elapsed = time.perf_counter() - started
+
+        if elapsed > startup_budget:
+            self.log_to_terminal(f'[<span style="color: yellow;">UI</span>] Window Built in {elapsed * 1000:.0f}ms (Budget: {startup_budget * 1000:.0f}ms)')
+
+        settings.subscribe_errors(self.settings_failed)
+
+    def settings_failed(self, error: Exception):
+        self.log_to_terminal(f'[<span style="color: red;">FAILURE</span>] Could not save settings, change reverted: {str(error)}')
+        self.settings_tab.sync(self.settings.snapshot)
 
     def init_ui(self):
         layout = QVBoxLayout()
         self.tabs = QTabWidget()
 
-        self.home_tab = HomeTab()
+        self.home_tab = HomeTab(self.activity)
         self.settings_tab = SettingsTab(self)
+        self.history_tab = HistoryTab(self)
+        self.stats_tab = StatsTab(self.counters)
 
         self.tabs.addTab(self.home_tab, 'Home')
         self.tabs.addTab(self.settings_tab, 'Settings')
+        self.tabs.addTab(self.history_tab, 'History')
+        self.tabs.addTab(self.stats_tab, 'Stats')
 
         layout.addWidget(self.tabs)
         self.setLayout(layout)
 
+        self.updates = UpdateChannel(self)
+        if self.counters is not None:
+            asyncio.ensure_future(self.load_counters())
+
+    async def load_counters(self):
+        for key, value in (await self.counters.totals()).items():
+            self.updates.queue_increment(key, value)
+
     def log_to_terminal(self, message: str):
         self.home_tab.add_to_terminal(message)
+        if self.activity is not None:
+            self.activity.write(message)
 
-    def increment_counter(self, key: str):
-        self.home_tab.increment_counter(key)
-
-app = QApplication(sys.argv)
+    def increment_counter(self, key: str, amount: int = 1):
+        self.home_tab.increment_counter(key, amount)
@@ -1,107 +1,121 @@
 import sys
 import json
 import asyncio
+import argparse
 
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QThread, pyqtSignal
-from qasync import QEventLoop
+conf = json.load(open('./settings.json', 'r', encoding='utf-8'))
 
-from telethon import TelegramClient, events, functions
-from telethon.tl.types import PeerUser
+def run_gui(args):
+    from PyQt5.QtWidgets import QApplication
+    from qasync import QEventLoop
 
-from framework.ui import *
+    from telethon import TelegramClient
 
-conf = json.load(open('./settings.json', 'r', encoding='utf-8'))
-ui = MainWindow()
-
-class Worker(QThread):
-    terminal_signal = pyqtSignal(str)
-    increment_signal = pyqtSignal(str)
-
-    def __init__(self, client: TelegramClient):
-        super().__init__()
-        self.client = client
-
-    async def handle_message(self, event):
-        message = event.message
-        if not event.is_private:
-            return
-        
-        result = await self.client(functions.messages.GetPeerSettingsRequest(
-            peer = PeerUser(event.sender_id)
-        ))
-
-        if not hasattr(result.settings, 'phone_country'):
-            self.terminal_signal.emit(
-                f"""[<span style="color: yellow;">FAILED</span>] There was no 'phone_country' attribute in the 'GetPeerSettingsRequest' class. This is likely because the version of Telethon you're using is outdated. Please update your client by uninstalling telethon, and running:<br><br>pip install git+https://github.com/LonamiWebs/Telethon.git@67765f84a58598cee3fa52abeea9a1f76c993fdd<br>"""
-            )
-            return
-        
-        if not result.settings.phone_country in settings.get_countries():
-            return
-        
-        self.terminal_signal.emit(
-            f"""[<span style="color: lightblue;">OUTPUT</span>] <b>Threat Detected</b> (UID: {event.sender_id}, Country: {result.settings.phone_country})"""
-        )
-        
-        should_block = settings.get_block_user()
-        should_delete = settings.get_delete_chat()
-        should_log = settings.get_log_user_info()
-
-        if should_log:
-            try:
-                self.terminal_signal.emit(
-                    f'<br>Username: {event.sender.username}<br>Nickname: {event.sender.first_name + ("" if not event.sender.last_name else " " + event.sender.last_name)}<br>Has Premium: {event.sender.premium != None}<br>Has Profile Picture: {event.sender.photo != None}<br>'
-                )
-            except:
-                pass
-           
-        if should_block:
-            await self.client(functions.contacts.BlockRequest(id = event.sender_id))
-            self.increment_signal.emit('Blocked')
-            self.terminal_signal.emit(
-                f"""[<span style="color: lightblue;">OUTPUT</span>] Blocked User"""
-            )
-        
-        if should_delete:
-            await self.client(functions.messages.DeleteHistoryRequest(peer = PeerUser(event.sender_id), max_id = 0, revoke = True))
-            self.increment_signal.emit('Deleted')
-            self.terminal_signal.emit(
-                f"""[<span style="color: lightblue;">OUTPUT</span>] Deleted Chat"""
-            )
-
-    def run(self):
-        self.client.add_event_handler(self.handle_message, events.NewMessage)
-
-async def start():
-    client = TelegramClient('Me', conf['api_id'], conf['api_hash'])
-    await client.start()
-
-    worker = Worker(client)
-    worker.terminal_signal.connect(ui.log_to_terminal)
-    worker.increment_signal.connect(ui.increment_counter)
-    worker.start()
-
-    await client.run_until_disconnected()
-    return worker
-
-def close_event_handler(worker):
-    if worker and worker.isRunning():
-        worker.quit()
-        worker.wait()
+    from framework.ui import MainWindow
+    from framework.database import Settings
+    from framework.engine import Engine, create_verdict_cache, create_known_bad
+    from framework.metrics import metrics
+    from framework.audit import AuditLog
+    from framework.bus import EventBus, count_record
+    from framework.activity import ActivityLog
+    from framework.counters import CounterStore
 
-if __name__ == '__main__':
     app = QApplication(sys.argv)
     loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
+
+    settings = Settings()
+    verdicts = create_verdict_cache(settings, conf)
+    audit = AuditLog(settings.db_path)
+    counters = CounterStore(settings.db_path, flush_interval = conf.get('counter_flush_interval', 30))
+    activity = ActivityLog(conf.get('activity_dir', 'logs'), max_bytes = conf.get('activity_max_bytes', 4 * 1024 * 1024), keep = conf.get('activity_keep', 50))
+
+    ui = MainWindow(settings, startup_budget = conf.get('startup_budget', 0.15), activity = activity, counters = counters)
     ui.show()
 
-    worker = None
+    bus = EventBus(settings)
+    bus.add_sink(ui.updates.queue_record, sheddable = True)
+    bus.add_sink(activity.sink)
+    bus.add_sink(count_record, filtered = False)
+
+    client = TelegramClient(args.session, conf['api_id'], conf['api_hash'], sequential_updates = True)
+    engine = Engine(
+        client, settings, verdicts, conf,
+        bus = bus,
+        increment = ui.updates.queue_increment,
+        known_bad = create_known_bad(settings),
+        audit = audit,
+        counters = counters
+    )
+
+    async def start():
+        asyncio.ensure_future(metrics.sample_loop_lag())
+        if conf.get('metrics_port'):
+            await metrics.serve(conf['metrics_port'])
+
+        await engine.start(sweep = args.sweep or conf.get('sweep_on_start', False))
+        await client.run_until_disconnected()
+
     try:
-        worker = loop.run_until_complete(start())
+        loop.run_until_complete(start())
     except Exception as E:
         ui.log_to_terminal(f'[<span style="color: red;">FAILURE</span>] {str(E)}')
 
-    app.aboutToQuit.connect(lambda: close_event_handler(worker))
     with loop:
         loop.run_forever()
+
+        try:
+            loop.run_until_complete(engine.stop())
+        except Exception as E:
+            print(f'Could not stop cleanly: {str(E)}')
+
+    audit.flush()
+    counters.flush()
+    activity.close()
+    settings.close()
+
+def import_reputation(args):
+    from framework.reputation import Reputation, read_id_list
+
+    reputation = Reputation(conf.get('reputation_file', 'reputation.bin'))
+    reputation.update(read_id_list(args.import_reputation))
+    added = reputation.refresh()
+    print(f'Imported {added} IDs into {reputation.path} ({len(reputation)} Total)')
+
+def forget_reputation(args):
+    from framework.reputation import Reputation, read_id_list
+
+    reputation = Reputation(conf.get('reputation_file', 'reputation.bin'))
+    before = len(reputation)
+    reputation.remove(read_id_list(args.forget_reputation))
+    reputation.refresh()
+    print(f'Removed {before - len(reputation)} IDs from {reputation.path} ({len(reputation)} Total)')
+
+def run_headless(args):
+    from framework import daemon
+
+    asyncio.run(daemon.run(
+        conf,
+        session = args.session,
+        sweep = args.sweep or conf.get('sweep_on_start', False),
+        log_file = args.log_file
+    ))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog = 'jeetblock')
+    parser.add_argument('--headless', action = 'store_true', help = 'run without the GUI and write a JSON log (runs every entry in "accounts")')
+    parser.add_argument('--session', default = 'Me', help = 'telethon session name')
+    parser.add_argument('--sweep', action = 'store_true', help = 'sweep existing private dialogs on start')
+    parser.add_argument('--log-file', default = None, help = 'headless log file (default: stdout)')
+    parser.add_argument('--import-reputation', default = None, metavar = 'FILE', help = 'merge a text file of known-bad user ids (one per line) into the reputation file and exit')
+    parser.add_argument('--forget-reputation', default = None, metavar = 'FILE', help = 'remove the user ids in a text file (one per line) from the reputation file and exit')
+    args = parser.parse_args()
+
+    if args.import_reputation:
+        import_reputation(args)
+    elif args.forget_reputation:
+        forget_reputation(args)
+    elif args.headless:
+        run_headless(args)
+    else:
+        run_gui(args)